@@ -11,7 +11,7 @@ Zendriver Proxy Service
 """
 
 from .browser_pool import BrowserPool
-from .cookie_manager import CookieManager
+from .cookie_manager import CookieManager, CookieRecord, CookieTable
 from .fetcher import Fetcher, FetchResult
 from .page_loader import CloudflareConfig, PageLoader, PageLoadResult
 from .proxy_config import ProxyConfig
@@ -19,6 +19,8 @@ from .proxy_config import ProxyConfig
 __all__ = [
     "BrowserPool",
     "CookieManager",
+    "CookieRecord",
+    "CookieTable",
     "Fetcher",
     "FetchResult",
     "ProxyConfig",
@@ -1,24 +1,211 @@
 """
 Browser Pool - 多代理浏览器实例池，支持并发控制和自动恢复
+
+每个代理对应一组浏览器实例，按状态分为三层：
+- Hot: 已就绪，可分配 Tab
+- Cold: 正在启动（预热中）
+- Retired: 已退役，等待进行中的请求结束后关闭
+
+默认所有代理共享一个 Chromium 进程，每个实例是其中一个独立的 BrowserContext
+（通过 Target.createBrowserContext 配置代理）；关闭 use_browser_contexts 后
+每个实例为独立的浏览器进程。
 """
 
 from __future__ import annotations
 
 import asyncio
 import logging
+import re
+import sys
 import time
-from typing import TYPE_CHECKING
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlparse
+
+from websockets.protocol import State
 
 import zendriver as zd
 from zendriver import cdp
 
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖，缺失时不做内存检查
+    psutil = None  # type: ignore[assignment]
+
 if TYPE_CHECKING:
-    from zendriver import Browser, Tab
+    from zendriver import Browser, Connection, Tab
 
     from .proxy_config import ProxyConfig
 
 logger = logging.getLogger(__name__)
 
+# 最近一次 CDP 调用成功后的这段时间内（秒），健康检查直接视为健康
+ACTIVITY_FRESHNESS = 30.0
+
+# 同一浏览器进程两次内存检查的最小间隔（秒）：遍历进程树的开销不小，不必每次释放都做
+MEMORY_CHECK_INTERVAL = 10.0
+
+# acquire 的总超时（秒）：获取浏览器 + 创建 Tab + 安装处理器
+ACQUIRE_TIMEOUT = 50.0
+
+if sys.version_info >= (3, 11):
+    _timeout = asyncio.timeout
+else:  # Python 3.10：async-timeout 是 asyncio.timeout 的原型，语义一致
+    from async_timeout import timeout as _timeout
+
+
+# 可拦截的资源类型（按开关分组）
+CSS_RESOURCE_TYPES = frozenset(
+    {cdp.network.ResourceType.STYLESHEET, cdp.network.ResourceType.FONT}
+)
+IMAGE_RESOURCE_TYPES = frozenset(
+    {cdp.network.ResourceType.IMAGE, cdp.network.ResourceType.MEDIA}
+)
+
+# 常见广告/统计域名
+AD_HOSTS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "scorecardresearch.com",
+)
+AD_URL_PATTERNS = tuple(f"*://*{host}/*" for host in AD_HOSTS)
+_AD_HOST_RE = re.compile(
+    r"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?(?:"
+    + "|".join(re.escape(host) for host in AD_HOSTS)
+    + r")(?::\d+)?(?:[/?#]|$)",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class BrowserEntry:
+    """浏览器实例条目"""
+
+    browser: Browser  # 上下文模式下为共享的宿主浏览器
+    key: str | None
+    context_id: cdp.browser.BrowserContextID | None = None  # None 表示独立进程
+    started_at: float = field(default_factory=time.time)
+    use_count: int = 0  # 累计分配次数
+    active_requests: int = 0  # 正在进行的请求数（引用计数）
+    retired: bool = False
+    last_probe: float = field(default_factory=time.time)  # 上次健康探测时间
+    last_activity: float = field(default_factory=time.time)  # 上次 CDP 调用成功的时间
+    expire_handle: asyncio.TimerHandle | None = None  # 超龄退役定时器
+    idle_tabs: deque[Tab] = field(default_factory=deque)  # 可复用的空闲 Tab
+    open_tabs: int = 0  # 由池创建且尚未关闭的 Tab 数（含空闲 Tab）
+    # id(Tab) -> 该 Tab 的 Fetch 事件处理器
+    tab_handlers: dict[int, ProxyAuthHandler] = field(default_factory=dict)
+
+
+@dataclass
+class HostLimit:
+    """单个 (域名, 代理) 的并发限制"""
+
+    semaphore: asyncio.Semaphore
+    # 持有者 + 等待者数：归零时才移除，否则被唤醒但尚未恢复执行的等待者
+    # 会和新建信号量的持有者同时运行，突破并发上限
+    refs: int = 0
+
+
+def _connection(browser: Browser) -> Connection:
+    """浏览器的 CDP 连接；未连接（已停止）时抛出 RuntimeError"""
+    connection = browser.connection
+    if connection is None:
+        raise RuntimeError("Browser is not connected")
+    return connection
+
+
+def _find_tab(browser: Browser, target_id: cdp.target.TargetID) -> Tab | None:
+    """按 target_id 查找浏览器中的页面 Tab"""
+    return next((t for t in browser.tabs if t.target_id == target_id), None)
+
+
+def _process_tree_rss(pid: int) -> int:
+    """浏览器主进程及其所有子进程（渲染、GPU 等）的 RSS 之和，进程已退出时为 0"""
+    assert psutil is not None
+    try:
+        process = psutil.Process(pid)
+        processes = [process, *process.children(recursive=True)]
+    except psutil.Error:
+        return 0
+    rss = 0
+    for proc in processes:
+        try:
+            rss += proc.memory_info().rss
+        except psutil.Error:  # 子进程可能已退出
+            continue
+    return rss
+
+
+class ProxyAuthHandler:
+    """
+    单个 Tab 的 Fetch 事件处理器：响应代理认证挑战并拦截无用资源
+
+    每个 Tab 只创建一次，Tab 复用时保持绑定，只需更新 proxy。
+    """
+
+    def __init__(
+        self,
+        tab: Tab,
+        proxy: ProxyConfig | None,
+        blocked_resource_types: frozenset[cdp.network.ResourceType],
+        block_ads: bool,
+    ):
+        self.tab = tab
+        self.proxy = proxy
+        self.blocked_resource_types = blocked_resource_types
+        self.block_ads = block_ads
+
+    @property
+    def needs_auth(self) -> bool:
+        return bool(self.proxy and self.proxy.needs_auth)
+
+    def should_block(self, event: cdp.fetch.RequestPaused) -> bool:
+        """是否拦截该请求"""
+        if event.resource_type in self.blocked_resource_types:
+            return True
+        return self.block_ads and _AD_HOST_RE.match(event.request.url) is not None
+
+    async def on_auth_required(self, event: cdp.fetch.AuthRequired) -> None:
+        """处理代理认证挑战 (HTTP 407)"""
+        logger.debug(f"Proxy auth required for: {event.request.url}")
+        auth_response = cdp.fetch.AuthChallengeResponse(
+            response="ProvideCredentials",
+            username=self.proxy.username if self.proxy else None,
+            password=self.proxy.password if self.proxy else None,
+        )
+        await self.tab.send(
+            cdp.fetch.continue_with_auth(event.request_id, auth_response)
+        )
+
+    async def on_request_paused(self, event: cdp.fetch.RequestPaused) -> None:
+        """拦截无用资源，其余请求继续"""
+        try:
+            if self.should_block(event):
+                await self.tab.send(
+                    cdp.fetch.fail_request(
+                        request_id=event.request_id,
+                        error_reason=cdp.network.ErrorReason.BLOCKED_BY_CLIENT,
+                    )
+                )
+            else:
+                await self.tab.send(
+                    cdp.fetch.continue_request(request_id=event.request_id)
+                )
+        except Exception as e:
+            logger.warning(f"Error continuing request: {e}")
+
 
 class BrowserPool:
     """多代理浏览器池，管理多个浏览器实例和并发"""
@@ -30,174 +217,496 @@ class BrowserPool:
         browser_args: list[str] | None = None,
         browser_executable_path: str | None = None,
         browser_max_age: int = 3600,  # 浏览器最大存活时间（秒）
-        health_check_interval: int = 60,  # 健康检查间隔（秒）
+        health_check_interval: int = 60,  # 同一浏览器两次健康探测的最小间隔（秒）
+        max_browsers_per_proxy: int = 2,  # 每个代理最多的浏览器实例数
+        browser_max_uses: int = 100,  # 单个浏览器最大分配次数，超过后退役
+        browser_max_rss_mb: float = 2048.0,  # 浏览器进程树的常驻内存上限（MB），超过后退役
+        per_host_limit: int = 4,  # 单个 (域名, 代理) 的最大并发数
+        avoid_css: bool = False,  # 拦截样式表和字体
+        avoid_images: bool = False,  # 拦截图片和音视频
+        avoid_ads: bool = False,  # 拦截常见广告/统计请求
+        max_idle_tabs_per_browser: int = 4,  # 每个浏览器保留的空闲 Tab 数
+        use_browser_contexts: bool = True,  # 共享一个浏览器进程，按代理创建 BrowserContext
     ):
         self.max_concurrent = max_concurrent
         self.headless = headless
+        # proxy_key -> 浏览器启动参数
+        self._args_cache: dict[str | None, tuple[str, ...]] = {}
         self.browser_args = browser_args or []
         self.browser_executable_path = browser_executable_path
         self.browser_max_age = browser_max_age
         self.health_check_interval = health_check_interval
-
-        # proxy_server -> Browser 实例
-        self._browsers: dict[str | None, Browser] = {}
-        self._browser_start_times: dict[str | None, float] = {}
+        self.max_browsers_per_proxy = max(1, max_browsers_per_proxy)
+        self.browser_max_uses = browser_max_uses
+        self.browser_max_rss_mb = browser_max_rss_mb
+        self.per_host_limit = max(1, per_host_limit)
+        self.avoid_css = avoid_css
+        self.avoid_images = avoid_images
+        self.avoid_ads = avoid_ads
+        self.max_idle_tabs_per_browser = max_idle_tabs_per_browser
+        self.use_browser_contexts = use_browser_contexts
+
+        blocked: set[cdp.network.ResourceType] = set()
+        if avoid_css:
+            blocked |= CSS_RESOURCE_TYPES
+        if avoid_images:
+            blocked |= IMAGE_RESOURCE_TYPES
+        self._blocked_resource_types = frozenset(blocked)
+
+        # proxy_key -> Hot 层浏览器实例
+        self._pools: dict[str | None, deque[BrowserEntry]] = {}
+        # proxy_key -> Cold 层（启动中）实例数
+        self._warming: defaultdict[str | None, int] = defaultdict(int)
+        # Retired 层：等待排空的实例
+        self._retired: list[BrowserEntry] = []
+        # id(Tab) -> 所属浏览器实例（Tab 定义了 __eq__，不可哈希）
+        self._tab_entries: dict[int, BrowserEntry] = {}
         self._semaphore = asyncio.Semaphore(max_concurrent)
+        # (域名, 代理) -> 单站点并发限制
+        self._host_limits: dict[tuple[str, str | None], HostLimit] = {}
+        # id(Tab) -> 占用的单站点信号量 key
+        self._tab_hosts: dict[int, tuple[str, str | None]] = {}
         self._lock = asyncio.Lock()
+        self._pool_changed = asyncio.Condition(self._lock)
+        # 上下文模式下承载所有 BrowserContext 的宿主浏览器
+        self._host_browser: Browser | None = None
+        self._host_lock = asyncio.Lock()
+        # 浏览器进程 pid -> (检查时间, 进程树 RSS 字节数)
+        self._rss_samples: dict[int, tuple[float, int]] = {}
         self._started = False
-        self._health_check_task: asyncio.Task | None = None
+
+    @property
+    def browser_args(self) -> list[str]:
+        return self._browser_args
+
+    @browser_args.setter
+    def browser_args(self, value: list[str]) -> None:
+        self._browser_args = value
+        # 参数变化时使缓存失效
+        self._args_cache.clear()
 
     def _browser_args_with_defaults(
         self, proxy: ProxyConfig | None = None
     ) -> list[str]:
-        """合并默认参数和代理参数"""
-        defaults = [
-            "--disable-blink-features=AutomationControlled",
-            "--disable-infobars",
-        ]
-        args = defaults + self.browser_args
+        """合并默认参数和代理参数（按 proxy_key 缓存）"""
+        key = proxy.proxy_key if proxy else None
+        args = self._args_cache.get(key)
+        if args is None:
+            defaults = (
+                "--disable-blink-features=AutomationControlled",
+                "--disable-infobars",
+            )
+            args = defaults + tuple(self._browser_args)
 
-        # 添加代理参数
-        if proxy:
-            args.append(proxy.to_browser_arg())
+            # 添加代理参数
+            if proxy:
+                args += (proxy.to_browser_arg(),)
+
+            self._args_cache[key] = args
 
-        return args
+        return list(args)
+
+    async def _launch_browser(self, proxy: ProxyConfig | None = None) -> BrowserEntry:
+        """创建一个新的浏览器实例（上下文模式下为宿主浏览器中的 BrowserContext）"""
+        key = proxy.proxy_key if proxy else None
+        if self.use_browser_contexts:
+            return await self._create_context(proxy)
+        browser = await self._start_browser(proxy)
+        return BrowserEntry(browser=browser, key=key)
+
+    async def _start_browser(self, proxy: ProxyConfig | None = None) -> "Browser":
+        """启动一个新的浏览器进程"""
+        key = proxy.proxy_key if proxy else None
+        logger.info(f"Creating browser for proxy: {key}")
+        browser = await zd.start(
+            headless=self.headless,
+            browser_args=self._browser_args_with_defaults(proxy),
+            sandbox=False,
+            browser_executable_path=self.browser_executable_path,
+        )
+        logger.info(f"Browser created for proxy: {key}")
+        return browser
+
+    async def _get_host_browser(self) -> "Browser":
+        """获取宿主浏览器，不存在或已退出时重新启动"""
+        async with self._host_lock:
+            host = self._host_browser
+            if host is None or host.stopped:
+                host = self._host_browser = await self._start_browser(None)
+            return host
+
+    async def _create_context(self, proxy: ProxyConfig | None = None) -> BrowserEntry:
+        """在宿主浏览器中创建一个使用指定代理的 BrowserContext"""
+        key = proxy.proxy_key if proxy else None
+        host = await self._get_host_browser()
+        if proxy:
+            command = cdp.target.create_browser_context(
+                proxy_server=proxy.server, proxy_bypass_list="<-loopback>"
+            )
+        else:
+            command = cdp.target.create_browser_context()
+        context_id = await _connection(host).send(command)
+        logger.info(f"Browser context created for proxy: {key}")
+        return BrowserEntry(browser=host, key=key, context_id=context_id)
+
+    async def _new_tab(self, entry: BrowserEntry) -> "Tab":
+        """在实例中打开一个空白 Tab"""
+        browser = entry.browser
+        if entry.context_id is None:
+            return await browser.get("about:blank", new_tab=True)
+        target_id = await _connection(browser).send(
+            cdp.target.create_target("about:blank", browser_context_id=entry.context_id)
+        )
+        # TargetCreated 事件通常先于命令响应处理完，此时 tabs 中已有该 Tab；
+        # 否则主动同步一次 targets
+        tab = _find_tab(browser, target_id)
+        if tab is None:
+            await browser.update_targets()
+            tab = _find_tab(browser, target_id)
+        if tab is None:
+            raise RuntimeError(f"Target {target_id} not found after creation")
+        return tab
 
     async def _get_or_create_browser(
         self, proxy: ProxyConfig | None = None
-    ) -> "Browser":
-        """获取或创建指定代理的浏览器实例"""
+    ) -> BrowserEntry:
+        """
+        获取或创建指定代理的浏览器实例
+
+        优先选择 Hot 层中进行中请求最少的实例；若所有实例都在忙且未达到
+        max_browsers_per_proxy，则启动新实例。返回前已增加引用计数。
+        """
         key = proxy.proxy_key if proxy else None
 
-        async with self._lock:
-            if key not in self._browsers:
-                logger.info(f"Creating browser for proxy: {key}")
-                start_kwargs = {
-                    "headless": self.headless,
-                    "browser_args": self._browser_args_with_defaults(proxy),
-                    "sandbox": False,
-                }
-                if self.browser_executable_path:
-                    start_kwargs["browser_executable_path"] = self.browser_executable_path
-                browser = await zd.start(**start_kwargs)
-                self._browsers[key] = browser
-                self._browser_start_times[key] = time.time()
-                self._started = True
-                logger.info(f"Browser created for proxy: {key}")
-
-            return self._browsers[key]
+        async with self._pool_changed:
+            while True:
+                hot = self._pools.setdefault(key, deque())
+                entry = min(hot, key=lambda e: e.active_requests, default=None)
+                can_grow = len(hot) + self._warming[key] < self.max_browsers_per_proxy
+                if entry is not None and (entry.active_requests == 0 or not can_grow):
+                    entry.active_requests += 1
+                    entry.use_count += 1
+                    return entry
+                if can_grow:
+                    self._warming[key] += 1
+                    break
+                # 所有名额都在启动中，等待其就绪
+                await self._pool_changed.wait()
+
+        # 在锁外启动浏览器，避免阻塞其他代理
+        try:
+            entry = await self._launch_browser(proxy)
+        except BaseException:
+            async with self._pool_changed:
+                self._warming[key] -= 1
+                self._pool_changed.notify_all()
+            raise
+
+        async with self._pool_changed:
+            self._warming[key] -= 1
+            entry.active_requests += 1
+            entry.use_count += 1
+            self._add_hot(entry)
+            self._pool_changed.notify_all()
+        return entry
+
+    async def _get_healthy_browser(
+        self, proxy: ProxyConfig | None = None
+    ) -> BrowserEntry:
+        """
+        获取浏览器实例，距上次探测超过 health_check_interval 时先探测一次
+
+        探测失败的实例会被退役，然后重新选择（必要时启动新实例）。
+        """
+        while True:
+            entry = await self._get_or_create_browser(proxy)
+            now = time.time()
+            if now - entry.last_probe <= self.health_check_interval:
+                return entry
+            # 先更新时间，避免并发请求重复探测同一实例
+            entry.last_probe = now
+            if await self._is_browser_healthy(entry):
+                return entry
+            logger.warning(f"Browser {entry.key} is unhealthy, retiring")
+            self._retire(entry)
+            if entry.context_id is not None:
+                self._discard_host(entry.browser)
+            self._release_entry(entry)
+
+    def _discard_host(self, browser: "Browser") -> None:
+        """宿主浏览器无响应：退役其上的所有上下文，之后的请求会启动新的宿主"""
+        if browser is self._host_browser:
+            self._host_browser = None
+        for hot in self._pools.values():
+            for entry in [e for e in hot if e.browser is browser]:
+                self._retire(entry)
+
+    def _add_hot(self, entry: BrowserEntry) -> None:
+        """将实例加入 Hot 层，并安排超龄退役定时器"""
+        self._pools.setdefault(entry.key, deque()).append(entry)
+        entry.expire_handle = asyncio.get_running_loop().call_later(
+            self.browser_max_age, self._expire, entry
+        )
+        self._started = True
+
+    def _expire(self, entry: BrowserEntry) -> None:
+        """超龄退役（由定时器触发）"""
+        entry.expire_handle = None
+        logger.info(
+            f"Browser {entry.key} exceeded max age ({self.browser_max_age}s), retiring"
+        )
+        self._retire(entry)
+        self._drain_retired()
 
     async def start(self) -> None:
-        """预启动默认浏览器（无代理）并启动健康检查"""
-        await self._get_or_create_browser(None)
-        # 启动健康检查任务
-        self._health_check_task = asyncio.create_task(self._health_check_loop())
-        logger.info("Browser pool started with health check")
+        """预启动默认浏览器（无代理）"""
+        entry = await self._launch_browser(None)
+        async with self._pool_changed:
+            self._add_hot(entry)
+            self._pool_changed.notify_all()
+        logger.info("Browser pool started")
+
+    async def prewarm(self, n: int, proxy: ProxyConfig | None = None) -> None:
+        """
+        并发打开 n 个 Tab 后立即释放，放入空闲队列
+
+        并发获取会按需并行启动实例（不超过 max_browsers_per_proxy），
+        最早的一批请求因此无需等待浏览器启动和 Tab 创建。
+        """
+        n = min(n, self.max_concurrent)
+        if n <= 0:
+            return
+        results = await asyncio.gather(
+            *(self.acquire(proxy) for _ in range(n)), return_exceptions=True
+        )
+        tabs = [r for r in results if not isinstance(r, BaseException)]
+        await asyncio.gather(*(self.release(tab) for tab in tabs))
+        key = proxy.proxy_key if proxy else None
+        logger.info(f"Prewarmed {len(tabs)}/{n} tabs for proxy: {key}")
 
     async def stop(self) -> None:
         """关闭所有浏览器实例"""
-        # 停止健康检查任务
-        if self._health_check_task:
-            self._health_check_task.cancel()
-            try:
-                await self._health_check_task
-            except asyncio.CancelledError:
-                pass
-            self._health_check_task = None
-
         async with self._lock:
-            for key, browser in self._browsers.items():
-                try:
-                    logger.info(f"Stopping browser for proxy: {key}")
-                    await asyncio.wait_for(browser.stop(), timeout=10.0)
-                except asyncio.TimeoutError:
-                    logger.warning(f"Browser stop timeout for {key}")
-                except Exception as e:
-                    logger.warning(f"Error stopping browser {key}: {e}")
-
-            self._browsers.clear()
-            self._browser_start_times.clear()
+            entries = [e for hot in self._pools.values() for e in hot]
+            entries.extend(self._retired)
+            stopped: set[int] = set()
+            for entry in entries:
+                if entry.expire_handle is not None:
+                    entry.expire_handle.cancel()
+                    entry.expire_handle = None
+                # 共享宿主的上下文随宿主一起关闭，每个进程只关闭一次
+                if id(entry.browser) in stopped:
+                    continue
+                stopped.add(id(entry.browser))
+                await self._stop_browser(entry.browser, entry.key)
+            if self._host_browser is not None and id(self._host_browser) not in stopped:
+                await self._stop_browser(self._host_browser, None)
+
+            self._host_browser = None
+            self._pools.clear()
+            self._retired.clear()
+            self._tab_entries.clear()
+            self._tab_hosts.clear()
+            self._rss_samples.clear()
             self._started = False
             logger.info("All browsers stopped")
 
-    async def acquire(self, proxy: ProxyConfig | None = None) -> "Tab":
+    @staticmethod
+    async def _stop_browser(browser: "Browser", key: str | None) -> None:
+        """关闭浏览器进程（stop 时使用）"""
+        try:
+            logger.info(f"Stopping browser for proxy: {key}")
+            await asyncio.wait_for(browser.stop(), timeout=10.0)
+        except asyncio.TimeoutError:
+            logger.warning(f"Browser stop timeout for {key}")
+        except Exception as e:
+            logger.warning(f"Error stopping browser {key}: {e}")
+
+    async def acquire(
+        self, proxy: ProxyConfig | None = None, url: str | None = None
+    ) -> "Tab":
         """
         获取一个新的 Tab（会等待信号量）
 
         Args:
             proxy: 代理配置，None 表示不使用代理
+            url: 目标 URL，用于按 (域名, 代理) 限制并发，None 表示不限制
 
         Returns:
             配置好的 Tab 实例
         """
-        await self._semaphore.acquire()
-
+        # 先等待单站点信号量，再占用全局名额，避免同站点排队的请求占满全局并发
+        host_key = self._host_key(url, proxy) if url else None
+        if host_key is not None:
+            limit = self._enter_host(host_key)
+            try:
+                await limit.semaphore.acquire()
+            except BaseException:
+                self._leave_host(host_key, limit)
+                raise
         try:
-            # 创建浏览器（带超时）
-            browser = await asyncio.wait_for(
-                self._get_or_create_browser(proxy),
-                timeout=30.0
-            )
-
-            # 创建新 Tab（带超时）
-            tab = await asyncio.wait_for(
-                browser.get("about:blank", new_tab=True),
-                timeout=10.0
-            )
-
-            # 如果代理需要认证，设置处理器（带超时）
-            if proxy and proxy.needs_auth:
-                await asyncio.wait_for(
-                    self._setup_proxy_auth(tab, proxy),
-                    timeout=10.0
-                )
+            await self._semaphore.acquire()
+        except BaseException:
+            if host_key is not None:
+                self._release_host(host_key)
+            raise
 
-            return tab
+        entry = None
+        tab = None
+        try:
+            # 获取浏览器、创建 Tab、安装处理器共用一个超时预算，只需一个定时器
+            async with _timeout(ACQUIRE_TIMEOUT):
+                entry = await self._get_healthy_browser(proxy)
+
+                # 优先复用空闲 Tab（处理器已在创建时安装）
+                tab = self._pop_idle_tab(entry)
+                if tab is not None:
+                    handler = entry.tab_handlers.get(id(tab))
+                    if handler is not None:
+                        # 同一 proxy_key 的密码可能已更新
+                        handler.proxy = proxy
+                    self._tab_entries[id(tab)] = entry
+                    if host_key is not None:
+                        self._tab_hosts[id(tab)] = host_key
+                    return tab
+
+                # 创建新 Tab
+                tab = await self._new_tab(entry)
+                entry.last_activity = time.time()
+                entry.open_tabs += 1
+                self._tab_entries[id(tab)] = entry
+                if host_key is not None:
+                    self._tab_hosts[id(tab)] = host_key
+
+                # 如果代理需要认证或需要拦截资源，设置处理器
+                if (proxy and proxy.needs_auth) or self._intercepts_resources:
+                    entry.tab_handlers[id(tab)] = await self._setup_interception(
+                        tab, proxy
+                    )
+
+                return tab
 
         except asyncio.TimeoutError as e:
             logger.error(f"Acquire timeout: {e}")
-            self._semaphore.release()
+            self._abort_acquire(entry, tab, host_key)
             raise
         except Exception as e:
             logger.error(f"Acquire error: {e}")
-            self._semaphore.release()
+            self._abort_acquire(entry, tab, host_key)
+            raise
+        except BaseException:
+            # 被取消（Fetcher 总超时、客户端断开）时同样要归还信号量和计数
+            logger.debug("Acquire cancelled, rolling back")
+            self._abort_acquire(entry, tab, host_key)
             raise
 
-    async def _setup_proxy_auth(self, tab: "Tab", proxy: "ProxyConfig") -> None:
-        """设置代理认证处理器"""
-
-        async def handle_auth_required(event: cdp.fetch.AuthRequired) -> None:
-            """处理代理认证挑战 (HTTP 407)"""
-            logger.debug(f"Proxy auth required for: {event.request.url}")
-            auth_response = cdp.fetch.AuthChallengeResponse(
-                response="ProvideCredentials",
-                username=proxy.username,
-                password=proxy.password,
+    def _abort_acquire(
+        self,
+        entry: BrowserEntry | None,
+        tab: "Tab | None",
+        host_key: tuple[str, str | None] | None,
+    ) -> None:
+        """acquire 失败时回滚已占用的资源"""
+        self._semaphore.release()
+        if tab is not None:
+            self._tab_entries.pop(id(tab), None)
+            self._tab_hosts.pop(id(tab), None)
+            if entry is not None:
+                self._forget_tab(entry, tab)
+            asyncio.create_task(self._safe_close_tab(tab))
+        if host_key is not None:
+            self._release_host(host_key)
+        if entry is not None:
+            self._release_entry(entry)
+
+    @staticmethod
+    def _host_key(url: str, proxy: ProxyConfig | None) -> tuple[str, str | None]:
+        """生成单站点并发限制的 key: (域名, 代理)"""
+        if not url.startswith(("http://", "https://")):
+            url = f"https://{url}"
+        return (urlparse(url).netloc, proxy.proxy_key if proxy else None)
+
+    def _enter_host(self, host_key: tuple[str, str | None]) -> HostLimit:
+        """登记一个等待者并返回指定 (域名, 代理) 的并发限制（不存在时创建）"""
+        limit = self._host_limits.get(host_key)
+        if limit is None:
+            limit = self._host_limits[host_key] = HostLimit(
+                asyncio.Semaphore(self.per_host_limit)
             )
-            await tab.send(
-                cdp.fetch.continue_with_auth(event.request_id, auth_response)
+        limit.refs += 1
+        return limit
+
+    def _leave_host(self, host_key: tuple[str, str | None], limit: HostLimit) -> None:
+        """注销一个持有者/等待者，最后一个离开时移除，以免字典无限增长"""
+        limit.refs -= 1
+        if limit.refs <= 0 and self._host_limits.get(host_key) is limit:
+            del self._host_limits[host_key]
+
+    def _release_host(self, host_key: tuple[str, str | None]) -> None:
+        """释放单站点信号量"""
+        limit = self._host_limits.get(host_key)
+        if limit is None:
+            return
+        limit.semaphore.release()
+        self._leave_host(host_key, limit)
+
+    @property
+    def _intercepts_resources(self) -> bool:
+        return bool(self._blocked_resource_types) or self.avoid_ads
+
+    def _request_patterns(self) -> list[cdp.fetch.RequestPattern]:
+        """需要拦截的请求模式（仅在无需代理认证时使用）"""
+        patterns = [
+            cdp.fetch.RequestPattern(url_pattern="*", resource_type=resource_type)
+            for resource_type in self._blocked_resource_types
+        ]
+        if self.avoid_ads:
+            patterns.extend(
+                cdp.fetch.RequestPattern(url_pattern=pattern)
+                for pattern in AD_URL_PATTERNS
             )
+        return patterns
 
-        async def handle_request_paused(event: cdp.fetch.RequestPaused) -> None:
-            """继续被暂停的请求"""
-            try:
-                await tab.send(cdp.fetch.continue_request(request_id=event.request_id))
-            except Exception as e:
-                logger.warning(f"Error continuing request: {e}")
+    async def _setup_interception(
+        self, tab: "Tab", proxy: "ProxyConfig | None"
+    ) -> ProxyAuthHandler:
+        """设置代理认证和资源拦截处理器"""
+        handler = ProxyAuthHandler(
+            tab, proxy, self._blocked_resource_types, self.avoid_ads
+        )
+
+        # 先把 Fetch 域标记为已启用：否则下面的 send 会先由 _register_handlers
+        # 发送一次不带参数的 fetch.enable（暂停所有请求），多一次往返
+        if cdp.fetch not in tab.enabled_domains:
+            tab.enabled_domains.append(cdp.fetch)
 
         # 注册事件处理器
-        tab.add_handler(cdp.fetch.AuthRequired, handle_auth_required)
-        tab.add_handler(cdp.fetch.RequestPaused, handle_request_paused)
+        if handler.needs_auth:
+            tab.add_handler(cdp.fetch.AuthRequired, handler.on_auth_required)
+        tab.add_handler(cdp.fetch.RequestPaused, handler.on_request_paused)
 
-        # 启用 Fetch 域，处理认证请求
-        await tab.send(cdp.fetch.enable(handle_auth_requests=True))
-        logger.debug(f"Proxy auth setup complete for {proxy.proxy_key}")
+        # 启用 Fetch 域：需要认证时必须暂停所有请求，否则只暂停要拦截的资源
+        if proxy is not None and handler.needs_auth:
+            await tab.send(cdp.fetch.enable(handle_auth_requests=True))
+            logger.debug(f"Proxy auth setup complete for {proxy.proxy_key}")
+        else:
+            await tab.send(cdp.fetch.enable(patterns=self._request_patterns()))
+            logger.debug("Resource interception setup complete")
+
+        return handler
 
     async def release(self, tab: "Tab") -> None:
-        """释放 Tab（确保信号量一定释放）"""
+        """释放 Tab（确保信号量一定释放），优先放回空闲队列复用"""
+        entry = self._tab_entries.pop(id(tab), None)
+        recycled = False
         try:
-            # Tab 关闭设置超时，避免卡住
-            await asyncio.wait_for(tab.close(), timeout=5.0)
+            if entry is not None:
+                recycled = await self._recycle_tab(entry, tab)
+            if not recycled:
+                # Tab 关闭设置超时，避免卡住
+                await asyncio.wait_for(tab.close(), timeout=5.0)
+            if entry is not None:
+                entry.last_activity = time.time()
         except asyncio.TimeoutError:
             logger.warning("Tab close timeout, forcing release")
         except Exception as e:
@@ -205,74 +714,173 @@ class BrowserPool:
         finally:
             # 无论如何都释放信号量
             self._semaphore.release()
+            host_key = self._tab_hosts.pop(id(tab), None)
+            if host_key is not None:
+                self._release_host(host_key)
+            if entry is not None:
+                if not recycled:
+                    self._forget_tab(entry, tab)
+                self._release_entry(entry)
+
+    async def _recycle_tab(self, entry: BrowserEntry, tab: "Tab") -> bool:
+        """
+        重置 Tab 并放回所属浏览器的空闲队列
 
-    async def _health_check_loop(self) -> None:
-        """定期健康检查"""
-        while True:
-            try:
-                await asyncio.sleep(self.health_check_interval)
-                await self._check_and_restart_browsers()
-            except asyncio.CancelledError:
-                logger.info("Health check loop cancelled")
-                break
-            except Exception as e:
-                logger.error(f"Health check error: {e}")
-
-    async def _check_and_restart_browsers(self) -> None:
-        """检查并重启有问题的浏览器"""
-        now = time.time()
-        browsers_to_restart: list[str | None] = []
-
-        async with self._lock:
-            for key in list(self._browsers.keys()):
-                browser = self._browsers[key]
-                start_time = self._browser_start_times.get(key, now)
-                age = now - start_time
-
-                # 检查是否超龄
-                if age > self.browser_max_age:
-                    logger.info(f"Browser {key} exceeded max age ({age:.0f}s), scheduling restart")
-                    browsers_to_restart.append(key)
-                    continue
+        Returns:
+            是否成功放回；失败时由调用方关闭 Tab
+        """
+        if entry.retired or len(entry.idle_tabs) >= self.max_idle_tabs_per_browser:
+            return False
+        try:
+            # 导航到空白页，终止页面脚本并释放页面内存
+            await asyncio.wait_for(
+                tab.send(cdp.page.navigate("about:blank")), timeout=5.0
+            )
+        except Exception as e:
+            logger.debug(f"Failed to reset tab, closing it: {e}")
+            return False
+        entry.idle_tabs.append(tab)
+        return True
+
+    def _pop_idle_tab(self, entry: BrowserEntry) -> "Tab | None":
+        """从空闲队列取出一个仍然存活的 Tab"""
+        while entry.idle_tabs:
+            tab = entry.idle_tabs.popleft()
+            if not tab.closed and any(t is tab for t in entry.browser.targets):
+                return tab
+            self._forget_tab(entry, tab)
+        return None
+
+    @staticmethod
+    def _forget_tab(entry: BrowserEntry, tab: "Tab") -> None:
+        """Tab 已关闭（或被丢弃），清理其在浏览器实例上的记录"""
+        entry.open_tabs -= 1
+        entry.tab_handlers.pop(id(tab), None)
+
+    def _release_entry(self, entry: BrowserEntry) -> None:
+        """减少引用计数，并按使用次数/内存占用决定是否退役"""
+        entry.active_requests -= 1
+        if not entry.retired:
+            if entry.use_count >= self.browser_max_uses:
+                logger.info(
+                    f"Browser {entry.key} reached max uses ({entry.use_count}), retiring"
+                )
+                self._retire(entry)
+            elif self._memory_exceeded(entry):
+                logger.info(
+                    f"Browser memory above {self.browser_max_rss_mb}MB, "
+                    f"retiring browser {entry.key}"
+                )
+                self._retire(entry)
+        self._drain_retired()
 
-                # 检查是否响应
-                if not await self._is_browser_healthy(browser):
-                    logger.warning(f"Browser {key} is unhealthy, scheduling restart")
-                    browsers_to_restart.append(key)
+    def _memory_exceeded(self, entry: BrowserEntry) -> bool:
+        """
+        实例所在浏览器进程树的常驻内存是否超过退役阈值
 
-        # 在锁外重启浏览器
-        for key in browsers_to_restart:
-            await self._restart_browser(key)
+        每个浏览器进程最多每 MEMORY_CHECK_INTERVAL 秒实际检查一次；超限后清零记录，
+        同一进程在下次检查前不会再退役其他实例，避免集体退役后又集体重启。
+        """
+        if psutil is None:
+            return False
+        pid = entry.browser._process_pid
+        if pid is None:
+            return False
+        now = time.monotonic()
+        sample = self._rss_samples.get(pid)
+        if sample is None or now - sample[0] >= MEMORY_CHECK_INTERVAL:
+            sample = self._rss_samples[pid] = (now, _process_tree_rss(pid))
+        if sample[1] <= self.browser_max_rss_mb * 1024 * 1024:
+            return False
+        self._rss_samples[pid] = (sample[0], 0)
+        return True
+
+    def _retire(self, entry: BrowserEntry) -> None:
+        """将实例从 Hot 层移入 Retired 层，不再分配新的 Tab"""
+        if entry.retired:
+            return
+        entry.retired = True
+        if entry.expire_handle is not None:
+            entry.expire_handle.cancel()
+            entry.expire_handle = None
+        hot = self._pools.get(entry.key)
+        if hot is not None and entry in hot:
+            hot.remove(entry)
+        self._retired.append(entry)
+
+    def _drain_retired(self) -> None:
+        """关闭所有已无进行中请求的退役实例"""
+        drained = [e for e in self._retired if e.active_requests <= 0]
+        for entry in drained:
+            self._retired.remove(entry)
+            entry.idle_tabs.clear()
+            entry.tab_handlers.clear()
+            if entry.context_id is None:
+                asyncio.create_task(self._safe_close_browser(entry.browser, entry.key))
+            elif entry.browser is self._host_browser:
+                asyncio.create_task(self._safe_close_context(entry))
+            elif not self._browser_in_use(entry.browser):
+                # 宿主已被替换，最后一个上下文排空后关闭旧进程
+                asyncio.create_task(self._safe_close_browser(entry.browser, entry.key))
+
+    def _browser_in_use(self, browser: "Browser") -> bool:
+        """是否仍有实例（Hot 或 Retired）使用该浏览器进程"""
+        return any(e.browser is browser for e in self._retired) or any(
+            e.browser is browser for hot in self._pools.values() for e in hot
+        )
+
+    async def _is_browser_healthy(self, entry: BrowserEntry) -> bool:
+        """
+        检查浏览器是否健康
 
-    async def _is_browser_healthy(self, browser: "Browser") -> bool:
-        """检查浏览器是否健康"""
+        连接已断开直接判定不健康；连接正常且最近有成功的 CDP 调用时直接判定健康，
+        只有空闲一段时间的实例才真正执行一次 Runtime.evaluate。
+        """
+        browser = entry.browser
+        connection = browser.connection
+        websocket = connection.websocket if connection else None
+        if websocket is None or websocket.state is not State.OPEN:
+            return False
+        if time.time() - entry.last_activity < ACTIVITY_FRESHNESS:
+            return True
         try:
             main_tab = browser.main_tab
             if main_tab is None:
                 return False
             # 尝试执行简单操作
-            await asyncio.wait_for(
-                main_tab.evaluate("1+1"),
-                timeout=5.0
-            )
+            await asyncio.wait_for(main_tab.evaluate("0"), timeout=5.0)
+            entry.last_activity = time.time()
             return True
         except Exception as e:
             logger.debug(f"Browser health check failed: {e}")
             return False
 
-    async def _restart_browser(self, key: str | None) -> None:
-        """重启指定浏览器"""
-        async with self._lock:
-            if key in self._browsers:
-                old_browser = self._browsers.pop(key)
-                self._browser_start_times.pop(key, None)
-                logger.info(f"Restarting browser for proxy: {key}")
+    async def _safe_close_tab(self, tab: "Tab") -> None:
+        """安全关闭 Tab"""
+        try:
+            await asyncio.wait_for(tab.close(), timeout=5.0)
+        except Exception as e:
+            logger.warning(f"Error closing tab: {e}")
 
-                # 异步关闭旧浏览器
-                asyncio.create_task(self._safe_close_browser(old_browser, key))
+    async def _safe_close_context(self, entry: BrowserEntry) -> None:
+        """安全关闭 BrowserContext（其中的 Tab 会一并关闭）"""
+        if entry.context_id is None:
+            return
+        try:
+            await asyncio.wait_for(
+                _connection(entry.browser).send(
+                    cdp.target.dispose_browser_context(entry.context_id)
+                ),
+                timeout=10.0,
+            )
+            logger.info(f"Old browser context closed for proxy: {entry.key}")
+        except Exception as e:
+            logger.warning(f"Error closing old browser context {entry.key}: {e}")
 
     async def _safe_close_browser(self, browser: "Browser", key: str | None) -> None:
         """安全关闭浏览器"""
+        if browser._process_pid is not None:
+            self._rss_samples.pop(browser._process_pid, None)
         try:
             await asyncio.wait_for(browser.stop(), timeout=10.0)
             logger.info(f"Old browser closed for proxy: {key}")
@@ -283,7 +891,7 @@ class BrowserPool:
     def is_started(self) -> bool:
         return self._started
 
-    def get_semaphore_status(self) -> dict:
+    def get_semaphore_status(self) -> dict[str, int]:
         """获取信号量状态"""
         return {
             "total": self.max_concurrent,
@@ -291,17 +899,24 @@ class BrowserPool:
             "in_use": self.max_concurrent - self._semaphore._value,
         }
 
-    async def get_stats(self) -> list[dict]:
+    async def get_stats(self) -> list[dict[str, Any]]:
         """获取浏览器实例统计信息"""
         async with self._lock:
             stats = []
             now = time.time()
-            for key, browser in self._browsers.items():
-                tab_count = len([t for t in browser.tabs if not t.closed])
-                age = now - self._browser_start_times.get(key, now)
-                stats.append({
-                    "proxy": key,
-                    "tabs": tab_count,
-                    "age_seconds": round(age, 1),
-                })
+            entries = [e for hot in self._pools.values() for e in hot]
+            entries.extend(self._retired)
+            for entry in entries:
+                stats.append(
+                    {
+                        "proxy": entry.key,
+                        "state": "retired" if entry.retired else "hot",
+                        "context_id": entry.context_id,
+                        "tabs": entry.open_tabs,
+                        "idle_tabs": len(entry.idle_tabs),
+                        "uses": entry.use_count,
+                        "active_requests": entry.active_requests,
+                        "age_seconds": round(now - entry.started_at, 1),
+                    }
+                )
             return stats
@@ -5,55 +5,202 @@ Cookie Manager - 按 (域名, 代理) 管理和复用 Cookie
 from __future__ import annotations
 
 import asyncio
-from typing import TYPE_CHECKING, Any
-from urllib.parse import urlparse
+import re
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+import msgpack
 
 if TYPE_CHECKING:
     from .proxy_config import ProxyConfig
 
 
+class CookieRecord(NamedTuple):
+    """单个 cookie（不可变，可直接共享给调用方而无需复制），仅在对外接口中构造"""
+
+    name: str
+    value: str
+    domain: str | None = None
+    path: str | None = None
+    secure: bool | None = None
+    http_only: bool | None = None
+    expires: float | None = None
+
+
+# 内部按行处理时使用的普通元组，字段顺序与 CookieRecord 一致
+CookieRow = tuple[
+    str, str, str | None, str | None, bool | None, bool | None, float | None
+]
+
+_COLUMN_COUNT = len(CookieRecord._fields)
+
+# 匹配 URL 的 netloc 部分（scheme 可省略），与 urlparse(...).netloc 结果一致
+_DOMAIN_RE = re.compile(r"^(?:https?://)?([^/?#]*)")
+
+
+@lru_cache(maxsize=4096)
+def _extract_domain(url: str) -> str:
+    """从 URL 提取域名（结果缓存，同一 URL 在一次抓取中会被解析多次）"""
+    m = _DOMAIN_RE.match(url)
+    return m.group(1) if m else url
+
+
+@dataclass(slots=True)
+class CookieTable:
+    """
+    一组 cookies 的列式存储：每个字段一个列表，第 i 个 cookie 由各列第 i 项组成
+
+    列表开销由所有 cookie 共享，而不是每个 cookie 一个字典。
+    """
+
+    names: list[str] = field(default_factory=list)
+    values: list[str] = field(default_factory=list)
+    domains: list[str | None] = field(default_factory=list)
+    paths: list[str | None] = field(default_factory=list)
+    secures: list[bool | None] = field(default_factory=list)
+    http_onlys: list[bool | None] = field(default_factory=list)
+    expires: list[float | None] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def append(
+        self,
+        name: str,
+        value: str,
+        domain: str | None = None,
+        path: str | None = None,
+        secure: bool | None = None,
+        http_only: bool | None = None,
+        expires: float | None = None,
+    ) -> None:
+        """追加一个 cookie"""
+        self.names.append(name)
+        self.values.append(value)
+        self.domains.append(domain)
+        self.paths.append(path)
+        self.secures.append(secure)
+        self.http_onlys.append(http_only)
+        self.expires.append(expires)
+
+    def records(self) -> tuple[CookieRecord, ...]:
+        """按行返回不可变的 CookieRecord"""
+        return tuple(
+            map(
+                CookieRecord._make,
+                zip(
+                    self.names,
+                    self.values,
+                    self.domains,
+                    self.paths,
+                    self.secures,
+                    self.http_onlys,
+                    self.expires,
+                ),
+            )
+        )
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        """转换为字典列表（用于 API 响应）"""
+        return [record._asdict() for record in self.records()]
+
+    def pack(self) -> bytes:
+        """序列化为 msgpack"""
+        return msgpack.packb(
+            (
+                self.names,
+                self.values,
+                self.domains,
+                self.paths,
+                self.secures,
+                self.http_onlys,
+                self.expires,
+            )
+        )
+
+    @classmethod
+    def unpack(cls, blob: bytes) -> "CookieTable":
+        """从 msgpack 反序列化"""
+        return cls(*msgpack.unpackb(blob, raw=False))
+
+    @staticmethod
+    def pack_rows(rows: Iterable[CookieRow]) -> bytes:
+        """将按 cookie 组织的行直接序列化为与 pack() 相同的列格式，无需构造表"""
+        columns = tuple(zip(*rows))
+        return msgpack.packb(columns or ((),) * _COLUMN_COUNT)
+
+    @staticmethod
+    def unpack_rows(blob: bytes) -> Iterator[CookieRow]:
+        """从 msgpack 直接按行还原为普通元组，无需构造表"""
+        return zip(*msgpack.unpackb(blob, raw=False))
+
+
 class CookieManager:
     """管理不同 (域名, 代理) 组合的 Cookie，支持复用"""
 
-    def __init__(self):
-        # key = (domain, proxy_server | None)
-        self._cookies: dict[tuple[str, str | None], list[dict[str, Any]]] = {}
+    def __init__(self, max_entries: int = 10000):
+        # 最多保存的 (域名, 代理) 组合数，超过后淘汰最久未使用的
+        self.max_entries = max_entries
+        # key = (domain, proxy_server | None) -> msgpack 序列化的 CookieTable，按最近使用排序
+        # 紧凑的 bytes 比每个 cookie 一个 dict 节省大量内存
+        self._cookies: OrderedDict[tuple[str, str | None], bytes] = OrderedDict()
+        # 仅用于 clear_cookies 的多步修改
         self._lock = asyncio.Lock()
 
     def get_domain(self, url: str) -> str:
         """从 URL 提取域名"""
-        # 如果没有 scheme，添加一个以便正确解析
-        if not url.startswith(("http://", "https://")):
-            url = f"https://{url}"
-        parsed = urlparse(url)
-        return parsed.netloc or parsed.path.split("/")[0]
-
-    def _make_key(
-        self, url: str, proxy: ProxyConfig | None
-    ) -> tuple[str, str | None]:
+        return _extract_domain(url)
+
+    def _make_key(self, url: str, proxy: ProxyConfig | None) -> tuple[str, str | None]:
         """生成存储 key"""
         domain = self.get_domain(url)
         proxy_key = proxy.proxy_key if proxy else None
         return (domain, proxy_key)
 
-    async def get_cookies(
+    # 读取和单次赋值在事件循环内是原子的，无需加锁
+    def get_cookies(
+        self, url: str, proxy: ProxyConfig | None = None
+    ) -> tuple[CookieRecord, ...]:
+        """获取指定 (域名, 代理) 的 cookies（不可变，调用方无法修改存储）"""
+        blob = self.get_cookies_raw(url, proxy)
+        if blob is None:
+            return ()
+        return tuple(map(CookieRecord._make, CookieTable.unpack_rows(blob)))
+
+    def get_cookies_raw(
         self, url: str, proxy: ProxyConfig | None = None
-    ) -> list[dict[str, Any]]:
-        """获取指定 (域名, 代理) 的 cookies"""
+    ) -> bytes | None:
+        """获取指定 (域名, 代理) 的序列化 cookies，不存在时返回 None"""
         key = self._make_key(url, proxy)
-        async with self._lock:
-            return self._cookies.get(key, []).copy()
+        blob = self._cookies.get(key)
+        if blob is not None:
+            self._cookies.move_to_end(key)
+        return blob
 
-    async def save_cookies(
+    def save_cookies(
         self,
         url: str,
-        cookies: list[dict[str, Any]],
+        cookies: CookieTable,
         proxy: ProxyConfig | None = None,
     ) -> None:
         """保存指定 (域名, 代理) 的 cookies"""
+        self.save_cookies_raw(url, cookies.pack(), proxy)
+
+    def save_cookies_raw(
+        self,
+        url: str,
+        blob: bytes,
+        proxy: ProxyConfig | None = None,
+    ) -> None:
+        """保存已序列化的 cookies（CookieTable.pack / pack_rows 的结果）"""
         key = self._make_key(url, proxy)
-        async with self._lock:
-            self._cookies[key] = cookies
+        self._cookies[key] = blob
+        self._cookies.move_to_end(key)
+        while len(self._cookies) > self.max_entries:
+            self._cookies.popitem(last=False)
 
     async def clear_cookies(
         self,
@@ -88,17 +235,15 @@ class CookieManager:
                 for k in keys_to_remove:
                     self._cookies.pop(k, None)
 
-    async def list_keys(self) -> list[dict[str, Any]]:
+    def list_keys(self) -> list[dict[str, Any]]:
         """列出所有已存储 cookie 的 (domain, proxy) 组合"""
-        async with self._lock:
-            return [
-                {"domain": domain, "proxy": proxy}
-                for (domain, proxy) in self._cookies.keys()
-            ]
+        return [
+            {"domain": domain, "proxy": proxy}
+            for (domain, proxy) in self._cookies.keys()
+        ]
 
-    async def list_domains(self) -> list[str]:
+    def list_domains(self) -> list[str]:
         """列出所有已存储 cookie 的域名（兼容旧接口）"""
-        async with self._lock:
-            # 返回唯一的域名列表
-            domains = set(domain for (domain, _) in self._cookies.keys())
-            return list(domains)
+        # 返回唯一的域名列表
+        domains = set(domain for (domain, _) in self._cookies.keys())
+        return list(domains)
@@ -13,10 +13,12 @@ from typing import TYPE_CHECKING, Any
 from zendriver import cdp
 
 from .browser_pool import BrowserPool
-from .cookie_manager import CookieManager
+from .cookie_manager import CookieManager, CookieTable
 from .page_loader import CloudflareConfig, PageLoader
 
 if TYPE_CHECKING:
+    from zendriver import Tab
+
     from .proxy_config import ProxyConfig
 
 logger = logging.getLogger(__name__)
@@ -77,6 +79,8 @@ class Fetcher:
         self.cookie_manager = cookie_manager
         self.default_timeout = default_timeout
         self.page_loader = PageLoader()
+        # 后台任务（保存 cookies 后再释放 Tab），保持强引用防止被回收
+        self._background_tasks: set[asyncio.Task[None]] = set()
 
     async def fetch(
         self,
@@ -142,10 +146,11 @@ class Fetcher:
     ) -> FetchResult:
         """实际执行抓取操作"""
         tab = None
+        save_task = None
 
         try:
-            # 1. 获取 Tab（会等待信号量，并设置代理认证）
-            tab = await self.browser_pool.acquire(proxy)
+            # 1. 获取 Tab（会等待全局及单站点信号量，并设置代理认证）
+            tab = await self.browser_pool.acquire(proxy, url)
 
             # 2. 加载该 (域名, 代理) 的 Cookies
             await self._load_cookies(tab, url, proxy)
@@ -159,9 +164,9 @@ class Fetcher:
                 cf_config=cf_config,
             )
 
-            # 4. 保存 Cookies（按域名+代理）
+            # 4. 后台保存 Cookies（按域名+代理），不阻塞返回结果
             if load_result.success:
-                await self._save_cookies(tab, url, proxy)
+                save_task = asyncio.create_task(self._save_cookies(tab, url, proxy))
 
             elapsed = time.time() - start_time
             return FetchResult(
@@ -188,47 +193,66 @@ class Fetcher:
             )
 
         finally:
-            # 5. 释放 Tab
+            # 5. 释放 Tab（有待保存的 cookies 时，保存完成后在后台释放）
             if tab:
-                await self.browser_pool.release(tab)
+                if save_task is not None:
+                    task = asyncio.create_task(self._release_after(save_task, tab))
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
+                else:
+                    await self.browser_pool.release(tab)
+
+    async def drain(self) -> None:
+        """等待后台任务完成（关闭浏览器池前调用，确保 cookies 已保存、Tab 已释放）"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+    async def _release_after(self, save_task: asyncio.Task[None], tab: Tab) -> None:
+        """等待 cookies 保存完成后释放 Tab"""
+        try:
+            await save_task
+        finally:
+            await self.browser_pool.release(tab)
 
     async def _load_cookies(
-        self, tab, url: str, proxy: ProxyConfig | None
+        self, tab: Tab, url: str, proxy: ProxyConfig | None
     ) -> None:
         """加载 (域名, 代理) 对应的 cookies 到 tab"""
         try:
-            cookies_data = await self.cookie_manager.get_cookies(url, proxy)
-            if not cookies_data:
+            blob = self.cookie_manager.get_cookies_raw(url, proxy)
+            if blob is None:
                 return
 
-            # 转换为 CookieParam 对象
-            cookie_params = []
-            for c in cookies_data:
-                param = cdp.network.CookieParam(
-                    name=c["name"],
-                    value=c["value"],
-                    domain=c.get("domain"),
-                    path=c.get("path"),
-                    secure=c.get("secure"),
-                    http_only=c.get("http_only"),
-                    expires=cdp.network.TimeSinceEpoch(c["expires"])
-                    if c.get("expires")
-                    else None,
+            # 直接从序列化数据按行（普通元组）构造 CookieParam 对象
+            CookieParam = cdp.network.CookieParam
+            TimeSinceEpoch = cdp.network.TimeSinceEpoch
+            rows = CookieTable.unpack_rows(blob)
+            cookie_params = [
+                CookieParam(
+                    name=name,
+                    value=value,
+                    domain=domain,
+                    path=path,
+                    secure=secure,
+                    http_only=http_only,
+                    expires=TimeSinceEpoch(expires) if expires else None,
                 )
-                cookie_params.append(param)
+                for name, value, domain, path, secure, http_only, expires in rows
+            ]
+            if not cookie_params:
+                return
 
-            if cookie_params:
-                await tab.send(cdp.storage.set_cookies(cookie_params))
-                logger.debug(
-                    f"Loaded {len(cookie_params)} cookies for {url} "
-                    f"(proxy: {proxy.proxy_key if proxy else None})"
-                )
+            await tab.send(cdp.storage.set_cookies(cookie_params))
+            logger.debug(
+                f"Loaded {len(cookie_params)} cookies for {url} "
+                f"(proxy: {proxy.proxy_key if proxy else None})"
+            )
 
         except Exception as e:
             logger.warning(f"Failed to load cookies: {e}")
 
     async def _save_cookies(
-        self, tab, url: str, proxy: ProxyConfig | None
+        self, tab: Tab, url: str, proxy: ProxyConfig | None
     ) -> None:
         """从 tab 保存 cookies 到管理器（按域名+代理）"""
         try:
@@ -236,24 +260,17 @@ class Fetcher:
             if not cookies:
                 return
 
-            # 转换为可序列化的字典
-            cookies_data = []
-            for c in cookies:
-                cookies_data.append(
-                    {
-                        "name": c.name,
-                        "value": c.value,
-                        "domain": c.domain,
-                        "path": c.path,
-                        "secure": c.secure,
-                        "http_only": c.http_only,
-                        "expires": c.expires,
-                    }
-                )
+            # 直接从 CDP cookie 序列化为存储格式，不构造中间字典
+            rows = [
+                (c.name, c.value, c.domain, c.path, c.secure, c.http_only, c.expires)
+                for c in cookies
+            ]
 
-            await self.cookie_manager.save_cookies(url, cookies_data, proxy)
+            self.cookie_manager.save_cookies_raw(
+                url, CookieTable.pack_rows(rows), proxy
+            )
             logger.debug(
-                f"Saved {len(cookies_data)} cookies for {url} "
+                f"Saved {len(rows)} cookies for {url} "
                 f"(proxy: {proxy.proxy_key if proxy else None})"
             )
 
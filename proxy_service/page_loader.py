@@ -5,9 +5,11 @@ Page Loader - 页面加载器，处理 Cloudflare 验证和特殊页面状态
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
 import time
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import TYPE_CHECKING, Any
 
 if TYPE_CHECKING:
@@ -16,9 +18,20 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@lru_cache(maxsize=1024)
+def compile_selector(selector: str) -> str:
+    """
+    将 CSS 选择器编译为检测元素是否存在的 JS 表达式（结果缓存）
+
+    轮询时只需一次 Runtime.evaluate，而不是每次都通过 DOM.getDocument
+    拉取整棵 DOM 树再 querySelector。
+    """
+    return f"document.querySelector({json.dumps(selector.strip())}) !== null"
+
+
+@dataclass(frozen=True, slots=True)
 class CloudflareConfig:
-    """Cloudflare 验证配置"""
+    """Cloudflare 验证配置（不可变，相同配置可在请求间共享）"""
 
     enabled: bool = True  # 是否启用 CF 验证
     max_retries: int = 3  # 最大重试次数
@@ -42,6 +55,10 @@ class CloudflareConfig:
         )
 
 
+# 默认配置只创建一次
+DEFAULT_CF_CONFIG = CloudflareConfig()
+
+
 @dataclass
 class PageLoadResult:
     """页面加载结果"""
@@ -128,7 +145,8 @@ class PageLoader:
         """
         from zendriver.core.cloudflare import cf_is_interactive_challenge_present
 
-        cf_config = cf_config or CloudflareConfig()
+        cf_config = cf_config or DEFAULT_CF_CONFIG
+        wait_probe = compile_selector(wait_for) if wait_for else None
         start_time = time.time()
         cf_detected = False
         cf_solved = False
@@ -227,10 +245,12 @@ class PageLoader:
                     )
 
                 # 3. 检测目标元素
-                if wait_for:
+                if wait_probe:
                     try:
-                        elem = await tab.select(wait_for, timeout=0.1)
-                        if elem:
+                        found = await asyncio.wait_for(
+                            tab.evaluate(wait_probe), timeout=5.0
+                        )
+                        if found:
                             logger.info(f"Target element found: {wait_for}")
                             return PageLoadResult(
                                 success=True,
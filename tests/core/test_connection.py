@@ -0,0 +1,479 @@
+import asyncio
+import json
+import threading
+from collections.abc import Callable
+from typing import Any
+
+import websockets
+
+from zendriver import cdp
+from zendriver.core.connection import (
+    MAPPER_SLOTS,
+    Connection,
+    HandlerDict,
+    HandlerList,
+    ProtocolException,
+    Transaction,
+    _serialize_error,
+    threaded_handler,
+)
+
+
+class FakeWebSocket:
+    """In-memory websocket that answers every command with an empty result."""
+
+    def __init__(self) -> None:
+        self.frames: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.sent: list[dict[str, Any]] = []
+        self.closed = False
+
+    async def send(self, message: bytes, text: bool = False) -> None:
+        assert text, "chrome only accepts text frames"
+        if self.closed:
+            raise websockets.exceptions.ConnectionClosedError(None, None)
+        command = json.loads(message)
+        self.sent.append(command)
+        self.frames.put_nowait(json.dumps({"id": command["id"], "result": {}}).encode())
+
+    async def recv(self, decode: bool | None = None) -> bytes:
+        frame = await self.frames.get()
+        if frame is None:
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+        return frame
+
+    def emit(self, method: str, params: dict[str, Any]) -> None:
+        self.frames.put_nowait(
+            json.dumps({"method": method, "params": params}).encode()
+        )
+
+    def close_remote(self) -> None:
+        self.closed = True
+        self.frames.put_nowait(None)
+
+
+def open_connection() -> tuple[Connection, FakeWebSocket]:
+    connection = Connection("ws://localhost")
+    websocket = FakeWebSocket()
+    connection.websocket = websocket  # type: ignore[assignment]
+    connection._ready = True
+    return connection, websocket
+
+
+async def close_connection(connection: Connection, websocket: FakeWebSocket) -> None:
+    websocket.close_remote()
+    assert connection.listener is not None and connection.listener.task is not None
+    await asyncio.wait_for(connection.listener.task, 1)
+
+
+def make_transaction(tx_id: int) -> Transaction:
+    tx = Transaction(cdp.page.navigate(url="https://example.com"))
+    tx.id = tx_id
+    return tx
+
+
+async def test_transaction_message_framing() -> None:
+    """Test the serialized command is valid json with the id spliced in."""
+    tx = make_transaction(42)
+
+    message = json.loads(tx.message)
+
+    assert message == {
+        "method": "Page.navigate",
+        "params": {"url": "https://example.com"},
+        "id": 42,
+    }
+
+    tx.id = 43
+    assert json.loads(tx.message)["id"] == 43
+
+
+async def test_transaction_message_without_params() -> None:
+    """Test framing of a command that has no params."""
+    tx = Transaction(cdp.page.enable())
+    tx.id = 7
+
+    assert json.loads(tx.message) == {"method": "Page.enable", "params": {}, "id": 7}
+
+
+async def test_transaction_message_keeps_unicode() -> None:
+    """Test non-ascii params survive the utf-8 encoded message."""
+    tx = Transaction(cdp.runtime.evaluate(expression="'zoë 👍'"))
+    tx.id = 1
+
+    assert json.loads(tx.message.decode())["params"]["expression"] == "'zoë 👍'"
+
+
+async def test_mapper_slot_round_trip() -> None:
+    """Test transactions are stored in their slot and popped by id."""
+    connection = Connection("ws://localhost")
+    tx = make_transaction(5)
+
+    connection._add_transaction(tx)
+
+    assert connection._fast_mapper[5] is tx
+    assert not connection.mapper
+    assert connection._pop_transaction(5) is tx
+    assert connection._fast_mapper[5] is None
+    assert connection._pop_transaction(5) is None
+
+
+async def test_mapper_wraparound_falls_back_to_dict() -> None:
+    """Test an id whose slot is held by a pending transaction goes to the dict."""
+    connection = Connection("ws://localhost")
+    pending = make_transaction(1)
+    wrapped = make_transaction(1 + MAPPER_SLOTS)
+
+    connection._add_transaction(pending)
+    connection._add_transaction(wrapped)
+
+    assert connection._fast_mapper[1] is pending
+    assert connection.mapper == {1 + MAPPER_SLOTS: wrapped}
+    assert connection._pop_transaction(1 + MAPPER_SLOTS) is wrapped
+    assert connection._pop_transaction(1) is pending
+    assert not connection.mapper
+
+
+async def test_mapper_reuses_slot_of_finished_transaction() -> None:
+    """Test a finished transaction's slot is taken over by a wrapped id."""
+    connection = Connection("ws://localhost")
+    finished = make_transaction(3)
+    connection._add_transaction(finished)
+    finished.set_result(None)
+
+    wrapped = make_transaction(3 + MAPPER_SLOTS)
+    connection._add_transaction(wrapped)
+
+    assert connection._fast_mapper[3] is wrapped
+    assert not connection.mapper
+    assert connection._pop_transaction(3) is None
+    assert connection._pop_transaction(3 + MAPPER_SLOTS) is wrapped
+
+
+async def test_mapper_negative_ids_use_dict() -> None:
+    """Test negative ids never touch the slot list."""
+    connection = Connection("ws://localhost")
+    tx = make_transaction(-1)
+
+    connection._add_transaction(tx)
+
+    assert connection.mapper == {-1: tx}
+    assert all(slot is None for slot in connection._fast_mapper)
+    assert connection._pop_transaction(-1) is tx
+
+
+def test_handler_dict_version_bumps() -> None:
+    """Test every mutation of the handler mapping bumps the version."""
+    handlers = HandlerDict()
+    versions = [handlers.version]
+
+    handlers["a"] = [print]
+    versions.append(handlers.version)
+    handlers["b"].append(print)  # missing key goes through __setitem__
+    versions.append(handlers.version)
+    handlers.touch()
+    versions.append(handlers.version)
+    del handlers["a"]
+    versions.append(handlers.version)
+    handlers.update(c=[])
+    versions.append(handlers.version)
+    handlers.setdefault("d", [])
+    versions.append(handlers.version)
+    handlers.pop("c")
+    versions.append(handlers.version)
+    handlers.popitem()
+    versions.append(handlers.version)
+    handlers.clear()
+    versions.append(handlers.version)
+
+    assert versions == sorted(set(versions))
+    assert not handlers
+
+
+def test_handler_list_mutations_bump_version() -> None:
+    """Test mutating a handler list in place bumps the owning dict's version."""
+    handlers = HandlerDict()
+    handlers["a"] = [print]
+    handler_list = handlers["a"]
+    assert isinstance(handler_list, HandlerList)
+
+    mutations: list[Callable[[], object]] = [
+        lambda: handler_list.append(repr),
+        lambda: handler_list.extend([str]),
+        lambda: handler_list.insert(0, len),
+        lambda: handler_list.remove(len),
+        lambda: handler_list.pop(),
+        lambda: handler_list.reverse(),
+        lambda: handler_list.sort(key=id),
+        lambda: handler_list.__setitem__(0, print),
+        lambda: handler_list.__delitem__(0),
+        lambda: handler_list.__iadd__([repr]),
+        lambda: handler_list.clear(),
+    ]
+    for mutate in mutations:
+        version = handlers.version
+        mutate()
+        assert handlers.version > version
+
+    version = handlers.version
+    handler_list += [print]
+    assert handlers.version > version
+    assert handlers["a"] is handler_list
+
+
+def test_handler_dict_copies_assigned_lists() -> None:
+    """Test plain lists are stored as handler lists owned by the dict."""
+    handlers = HandlerDict()
+    plain = [print]
+
+    handlers["a"] = plain
+    handlers.update(b=[repr])
+    handlers.setdefault("c", [len])
+
+    assert all(isinstance(value, HandlerList) for value in handlers.values())
+    assert handlers["a"] == plain and handlers["a"] is not plain
+    assert handlers.copy()["a"] is not handlers["a"]
+
+
+def test_handler_dict_lookup_keeps_version() -> None:
+    """Test reading existing handlers does not bump the version."""
+    handlers = HandlerDict()
+    handlers["a"] = [print]
+    version = handlers.version
+
+    assert handlers["a"] == [print]
+    assert handlers.get("b") is None
+    assert "b" not in handlers
+    assert handlers.version == version
+
+
+async def test_add_and_remove_handlers_bump_version() -> None:
+    """Test Connection.add_handler and remove_handlers bump the handlers version."""
+    connection = Connection("ws://localhost")
+    handlers = connection.handlers
+    assert isinstance(handlers, HandlerDict)
+
+    def handler(event: cdp.page.LoadEventFired) -> None:
+        pass
+
+    version = handlers.version
+    connection.add_handler(cdp.page.LoadEventFired, handler)
+    assert handlers.version > version
+
+    version = handlers.version
+    connection.add_handler(cdp.page.LoadEventFired, print)
+    assert handlers.version > version
+
+    version = handlers.version
+    connection.remove_handlers(cdp.page.LoadEventFired, handler)
+    assert handlers.version > version
+    assert handlers[cdp.page.LoadEventFired] == [print]
+
+    version = handlers.version
+    connection.remove_handlers(cdp.page.LoadEventFired)
+    assert handlers.version > version
+
+    connection.add_handler(cdp.page, handler)
+    version = handlers.version
+    connection.remove_handlers()
+    assert handlers.version > version
+    assert not handlers
+
+
+async def test_in_place_handler_edits_refresh_dispatch_table() -> None:
+    """Test handlers appended to or removed from the public lists are dispatched."""
+    connection = Connection("ws://localhost")
+
+    def handler(event: cdp.page.LoadEventFired) -> None:
+        pass
+
+    connection.handlers[cdp.page.LoadEventFired].append(handler)
+    table = connection._get_dispatch_table()
+    assert [entry[0] for entry in table[cdp.page.LoadEventFired]] == [handler]
+
+    connection.handlers[cdp.page.LoadEventFired].remove(handler)
+    assert cdp.page.LoadEventFired not in connection._get_dispatch_table()
+
+
+async def test_sync_handlers_are_called_on_the_loop() -> None:
+    """Test plain handlers run on the event loop thread, outside the listener task."""
+    connection, websocket = open_connection()
+    called = asyncio.Event()
+    calls: list[tuple[float, int, bool]] = []
+
+    def handler(event: cdp.page.LoadEventFired) -> None:
+        # scheduled with call_soon, so not inside the listener's task
+        calls.append(
+            (event.timestamp, threading.get_ident(), asyncio.current_task() is None)
+        )
+        called.set()
+
+    connection.add_handler(cdp.page.LoadEventFired, handler)
+    await connection.send(cdp.page.enable())
+    websocket.emit("Page.loadEventFired", {"timestamp": 1.5})
+    await asyncio.wait_for(called.wait(), 1)
+
+    assert calls == [(1.5, threading.get_ident(), True)]
+    await close_connection(connection, websocket)
+
+
+async def test_handlers_receive_the_connection() -> None:
+    """Test handlers taking two arguments are passed the connection."""
+    connection, websocket = open_connection()
+    received: asyncio.Queue[object] = asyncio.Queue()
+
+    def sync_handler(event: cdp.page.LoadEventFired, conn: Connection) -> None:
+        received.put_nowait(conn)
+
+    async def async_handler(event: cdp.page.LoadEventFired, conn: Connection) -> None:
+        received.put_nowait(conn)
+
+    connection.add_handler(cdp.page.LoadEventFired, sync_handler)
+    connection.add_handler(cdp.page.LoadEventFired, async_handler)
+    await connection.send(cdp.page.enable())
+    websocket.emit("Page.loadEventFired", {"timestamp": 1.0})
+
+    assert await asyncio.wait_for(received.get(), 1) is connection
+    assert await asyncio.wait_for(received.get(), 1) is connection
+    await close_connection(connection, websocket)
+
+
+async def test_threaded_handler_runs_in_a_worker_thread() -> None:
+    """Test handlers decorated with threaded_handler run off the loop thread."""
+    connection, websocket = open_connection()
+    loop = asyncio.get_running_loop()
+    thread_ids: asyncio.Queue[int] = asyncio.Queue()
+
+    @threaded_handler
+    def handler(event: cdp.page.LoadEventFired) -> None:
+        loop.call_soon_threadsafe(thread_ids.put_nowait, threading.get_ident())
+
+    connection.add_handler(cdp.page.LoadEventFired, handler)
+    await connection.send(cdp.page.enable())
+    websocket.emit("Page.loadEventFired", {"timestamp": 1.0})
+
+    assert await asyncio.wait_for(thread_ids.get(), 1) != threading.get_ident()
+    await close_connection(connection, websocket)
+
+
+async def test_unhandled_events_are_skipped() -> None:
+    """Test events without handlers, unknown or malformed frames don't stop the listener."""
+    connection, websocket = open_connection()
+    await connection.send(cdp.page.enable())
+
+    websocket.emit("Page.loadEventFired", {"timestamp": 1.0})
+    websocket.emit("Unknown.event", {})
+    websocket.frames.put_nowait(b"not json")
+
+    await connection.send(cdp.page.disable())
+    assert connection.listener is not None and connection.listener.running
+    await close_connection(connection, websocket)
+
+
+def serialize_recursively(obj: dict[str, Any], depth: int = 0) -> str:
+    # the recursive formatter _serialize_error replaced
+    res = "\n"
+    for k, v in obj.items():
+        space = "\t" * depth
+        if isinstance(v, dict):
+            res += f"{space}{k}: {serialize_recursively(v, depth + 1)}\n"
+        else:
+            res += f"{space}{k}: {v}\n"
+    return res
+
+
+def test_serialize_error_matches_recursive_format() -> None:
+    """Test nested error dicts are formatted like the recursive version."""
+    error = {
+        "code": -32000,
+        "message": "Cannot find context",
+        "data": {"frame": {"id": "A1", "url": "about:blank"}, "reason": "gone"},
+        "empty": {},
+        "last": True,
+    }
+
+    assert _serialize_error(error) == serialize_recursively(error)
+    assert _serialize_error({}) == "\n"
+
+
+def test_serialize_error_handles_deep_nesting() -> None:
+    """Test deeply nested errors don't hit the recursion limit."""
+    error: dict[str, Any] = {"value": 1}
+    for _ in range(5000):
+        error = {"nested": error}
+
+    message = _serialize_error(error)
+
+    assert message.count("nested: ") == 5000
+    assert "\t" * 5000 + "value: 1\n" in message
+
+
+def test_protocol_exception_formats_to_json_errors() -> None:
+    """Test ProtocolException uses the formatter for objects with to_json."""
+
+    class Error:
+        def to_json(self) -> dict[str, Any]:
+            return {"message": "failed", "data": {"code": 1}}
+
+    assert str(ProtocolException(Error())) == "\nmessage: failed\ndata: \n\tcode: 1\n\n"
+
+
+async def test_writer_sends_queued_commands_in_order() -> None:
+    """Test concurrent sends are written by the single writer in id order."""
+    connection, websocket = open_connection()
+
+    await asyncio.gather(*(connection.send(cdp.page.enable()) for _ in range(20)))
+
+    ids = [command["id"] for command in websocket.sent]
+    assert len(ids) == 20 and ids == sorted(ids)
+    assert connection._writer_task is not None and not connection._writer_task.done()
+    await close_connection(connection, websocket)
+
+
+async def test_writer_fails_send_when_the_connection_closed() -> None:
+    """Test a send on a closed websocket raises instead of hanging."""
+    connection, websocket = open_connection()
+    await connection.send(cdp.page.enable())
+    websocket.closed = True
+
+    try:
+        await asyncio.wait_for(connection.send(cdp.page.disable()), 1)
+    except ProtocolException as e:
+        assert "websocket connection closed" in str(e)
+    else:
+        raise AssertionError("send did not fail")
+
+    assert connection._writer_task is not None and connection._writer_task.done()
+    assert not connection.mapper and not any(connection._fast_mapper)
+    await close_connection(connection, websocket)
+
+
+async def test_fail_buffered_sends() -> None:
+    """Test queued transactions are failed and unregistered."""
+    connection = Connection("ws://localhost")
+    txs = [make_transaction(tx_id) for tx_id in (1, 2, 1 + MAPPER_SLOTS)]
+    for tx in txs:
+        connection._add_transaction(tx)
+        connection._send_buffer.append(tx)
+
+    connection._fail_buffered_sends("gone")
+
+    assert not connection._send_buffer
+    assert not connection.mapper and not any(connection._fast_mapper)
+    for tx in txs:
+        exception = tx.exception()
+        assert isinstance(exception, ProtocolException)
+        assert exception.message == "gone"
+
+
+async def test_listener_stop_stops_the_writer() -> None:
+    """Test the writer is stopped once the remote end closes the connection."""
+    connection, websocket = open_connection()
+    await connection.send(cdp.page.enable())
+    writer = connection._writer_task
+    assert writer is not None
+
+    await close_connection(connection, websocket)
+    await asyncio.sleep(0)
+
+    assert connection._writer_task is None
+    assert writer.done()
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, cast
+
+import pytest
+
+from proxy_service.browser_pool import BrowserPool
+from proxy_service.cookie_manager import CookieManager
+from proxy_service.fetcher import Fetcher
+from zendriver import Tab
+
+
+class RecordingPool:
+    """Stand-in for BrowserPool that records released tabs."""
+
+    def __init__(self) -> None:
+        self.released: list[Any] = []
+
+    async def release(self, tab: Any) -> None:
+        self.released.append(tab)
+
+
+def make_fetcher() -> tuple[Fetcher, RecordingPool]:
+    pool = RecordingPool()
+    return Fetcher(cast(BrowserPool, pool), CookieManager()), pool
+
+
+async def test_release_after_waits_for_the_save() -> None:
+    """Test the tab is only released once the cookie save has finished."""
+    fetcher, pool = make_fetcher()
+    gate = asyncio.Event()
+    tab = cast(Tab, object())
+    save_task = asyncio.create_task(gate.wait())
+    release = asyncio.create_task(fetcher._release_after(cast(Any, save_task), tab))
+    await asyncio.sleep(0)
+    assert pool.released == []
+
+    gate.set()
+    await release
+
+    assert pool.released == [tab]
+
+
+async def test_release_after_releases_when_the_save_fails() -> None:
+    """Test a failing cookie save still releases the tab."""
+    fetcher, pool = make_fetcher()
+    tab = cast(Tab, object())
+
+    async def fail() -> None:
+        raise RuntimeError("save failed")
+
+    with pytest.raises(RuntimeError):
+        await fetcher._release_after(asyncio.create_task(fail()), tab)
+
+    assert pool.released == [tab]
+
+
+async def test_drain_waits_for_background_releases() -> None:
+    """Test drain returns only after every background release has run."""
+    fetcher, pool = make_fetcher()
+    gate = asyncio.Event()
+    tabs = [cast(Tab, object()) for _ in range(2)]
+    for tab in tabs:
+        save_task = asyncio.create_task(gate.wait())
+        task = asyncio.create_task(fetcher._release_after(cast(Any, save_task), tab))
+        fetcher._background_tasks.add(task)
+        task.add_done_callback(fetcher._background_tasks.discard)
+
+    drain = asyncio.create_task(fetcher.drain())
+    await asyncio.sleep(0)
+    assert not drain.done()
+    gate.set()
+    await drain
+
+    assert pool.released == tabs
+    assert not fetcher._background_tasks
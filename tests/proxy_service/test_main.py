@@ -0,0 +1,153 @@
+import asyncio
+import importlib.util
+import json
+from typing import Any
+
+import pytest
+
+from proxy_service import main
+from proxy_service.main import (
+    DEFAULT_RESPONSE_CLASS,
+    FetchLoadShedder,
+    _normalize_domain,
+    _prefers_html,
+)
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        ("text/html", True),
+        ("text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8", True),
+        ("text/*", True),
+        ("application/json, text/html;q=0.9", False),
+        ("text/html;q=0.5, application/json;q=0.8", False),
+        ("application/json, text/html", False),
+        ("*/*", False),
+        ("", False),
+        ("application/not-text/html", False),
+        ("TEXT/HTML; Q=1", True),
+        ("text/html;q=oops", False),
+    ],
+)
+def test_prefers_html(accept: str, expected: bool) -> None:
+    """Test raw mode is only picked when text/html outranks application/json."""
+    assert _prefers_html(accept) is expected
+
+
+def test_default_response_class_encodes_json() -> None:
+    """Test the default response class produces plain JSON for fetch results."""
+    content = {"html": "<p>é</p>", "elapsed": 0.5, "error": None}
+
+    response = DEFAULT_RESPONSE_CLASS(content=content)
+
+    assert response.media_type == "application/json"
+    assert json.loads(bytes(response.body)) == content
+
+
+class GatedApp:
+    """ASGI app that answers 200 once its gate is opened."""
+
+    def __init__(self) -> None:
+        self.gate = asyncio.Event()
+        self.calls = 0
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        self.calls += 1
+        await self.gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def call(app: Any, path: str) -> list[dict[str, Any]]:
+    messages: list[dict[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": []}
+    await app(scope, receive, send)
+    return messages
+
+
+async def test_load_shedder_rejects_over_limit() -> None:
+    """Test /fetch requests over the limit get a 503 without reaching the app."""
+    inner = GatedApp()
+    shedder = FetchLoadShedder(inner, limit=1)
+
+    first = asyncio.create_task(call(shedder, "/fetch"))
+    await asyncio.sleep(0)
+    assert inner.calls == 1
+
+    rejected = await call(shedder, "/fetch")
+    assert inner.calls == 1
+    assert rejected[0]["status"] == 503
+    assert (b"retry-after", b"1") in rejected[0]["headers"]
+    assert json.loads(rejected[1]["body"]) == {"detail": "overloaded"}
+
+    inner.gate.set()
+    assert (await first)[0]["status"] == 200
+
+    # the slot is released once the in-flight request finishes
+    assert (await call(shedder, "/fetch"))[0]["status"] == 200
+    assert inner.calls == 2
+
+
+async def test_load_shedder_frees_the_slot_when_the_app_fails() -> None:
+    """Test a request that raises still gives its slot back."""
+
+    async def failing_app(scope: Any, receive: Any, send: Any) -> None:
+        raise RuntimeError("boom")
+
+    shedder = FetchLoadShedder(failing_app, limit=1)
+
+    with pytest.raises(RuntimeError):
+        await call(shedder, "/fetch")
+    assert shedder._in_flight == 0
+
+
+async def test_load_shedder_ignores_other_paths() -> None:
+    """Test requests to other paths are never counted or rejected."""
+    inner = GatedApp()
+    inner.gate.set()
+    shedder = FetchLoadShedder(inner, limit=0)
+
+    assert (await call(shedder, "/status"))[0]["status"] == 200
+    assert (await call(shedder, "/fetch"))[0]["status"] == 503
+    assert inner.calls == 1
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ("example.com", ("example.com", "https://example.com")),
+        ("example.com/path?q=1", ("example.com", "https://example.com")),
+        (
+            "sub.example.com:8443",
+            ("sub.example.com:8443", "https://sub.example.com:8443"),
+        ),
+        ("https://example.com/path", ("example.com", "https://example.com/path")),
+        ("http://example.com", ("example.com", "http://example.com")),
+    ],
+)
+def test_normalize_domain(raw: str, expected: tuple[str, str]) -> None:
+    """Test domains and urls are normalized to (domain, lookup url)."""
+    assert _normalize_domain(raw) == expected
+
+
+def test_metrics_survive_a_second_import(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test importing the module again (as uvicorn does) doesn't re-register metrics."""
+    pytest.importorskip("prometheus_fastapi_instrumentator")
+    monkeypatch.setenv("METRICS_ENABLED", "1")
+
+    for name in ("first", "second"):
+        spec = importlib.util.spec_from_file_location(
+            f"proxy_service._main_{name}", main.__file__
+        )
+        assert spec is not None and spec.loader is not None
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        assert module.fetch_counter is not None
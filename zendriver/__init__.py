@@ -7,11 +7,11 @@ from zendriver.core._contradict import (
 )
 from zendriver.core.browser import Browser
 from zendriver.core.config import Config
-from zendriver.core.connection import Connection
+from zendriver.core.connection import Connection, threaded_handler
 from zendriver.core.element import Element
+from zendriver.core.keys import KeyEvents, KeyModifiers, KeyPressEvent, SpecialKeys
 from zendriver.core.tab import Tab
 from zendriver.core.util import loop, start
-from zendriver.core.keys import KeyEvents, SpecialKeys, KeyPressEvent, KeyModifiers
 
 __all__ = [
     "__version__",
@@ -26,6 +26,7 @@ __all__ = [
     "ContraDict",
     "cdict",
     "Connection",
+    "threaded_handler",
     "KeyEvents",
     "SpecialKeys",
     "KeyPressEvent",
@@ -2,8 +2,8 @@ from __future__ import annotations
 
 import asyncio
 import collections
+import functools
 import inspect
-import itertools
 import json
 import logging
 import sys
@@ -16,10 +16,11 @@ from typing import (
     Awaitable,
     Callable,
     Generator,
+    Iterable,
+    List,
     Optional,
     TypeVar,
     Union,
-    List,
 )
 
 import websockets
@@ -28,6 +29,29 @@ import websockets.asyncio.client
 from .. import cdp
 from . import util
 
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def _loads(data: bytes | str) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects lone surrogate escapes ("\ud8xx"), which chrome
+            # sends when it truncates page strings. the stdlib parser accepts them.
+            return json.loads(data)
+
+except ImportError:  # pragma: no cover - orjson is optional
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def _loads(data: bytes | str) -> Any:
+        return json.loads(data)
+
+
 if TYPE_CHECKING:
     from zendriver.core.browser import Browser
 
@@ -37,11 +61,95 @@ T = TypeVar("T")
 GLOBAL_DELAY = 0.005
 MAX_SIZE: int = 2**28
 PING_TIMEOUT: int = 900  # 15 minutes
+# transactions are kept in a fixed size list indexed by `id & MAPPER_MASK`,
+# only ids whose slot is already taken end up in the (fallback) mapper dict
+MAPPER_SLOTS: int = 4096
+MAPPER_MASK: int = MAPPER_SLOTS - 1
 
 TargetType = Union[cdp.target.TargetInfo, cdp.target.TargetID]
+# (handler, is_coroutine_function, threaded), see Connection._get_dispatch_table
+_DispatchEntry = tuple[Callable[..., Any], bool, bool]
 
 logger = logging.getLogger("uc.connection")
 
+# event module name -> cdp domain module, resolved once per module
+_DOMAIN_CACHE: dict[str, types.ModuleType] = {}
+
+
+# id(cdp domain module) -> event classes of that domain, see Connection.add_handler
+_MODULE_EVENT_CACHE: dict[int, list[Any]] = {}
+
+
+def _module_events(module: types.ModuleType) -> list[Any]:
+    events = _MODULE_EVENT_CACHE.get(id(module))
+    if events is None:
+        events = []
+        for name, obj in inspect.getmembers_static(module):
+            if name.isupper():
+                continue
+            if not name[0].isupper():
+                continue
+            if type(obj) is type:
+                continue
+            if inspect.isbuiltin(obj):
+                continue
+            events.append(obj)
+        _MODULE_EVENT_CACHE[id(module)] = events
+    return events
+
+
+def _domain_of(event_type: type) -> types.ModuleType:
+    module_name = event_type.__module__
+    domain_mod = _DOMAIN_CACHE.get(module_name)
+    if domain_mod is None:
+        domain_mod = _DOMAIN_CACHE[module_name] = util.cdp_get_module(module_name)
+    return domain_mod
+
+
+def threaded_handler(handler: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    marks a synchronous event handler to be run in a worker thread.
+
+    synchronous handlers are called directly on the event loop, which is the
+    fastest option for quick handlers, but a handler that blocks (disk or network io,
+    heavy computation) stalls every connection. decorate such handlers
+    with this to have them run through :func:`asyncio.to_thread` instead.
+
+    .. code-block::
+
+        @threaded_handler
+        def save_response(event: cdp.network.ResponseReceived) -> None:
+            with open("responses.log", "a") as f:
+                f.write(event.response.url + "\n")
+
+        page.add_handler(cdp.network.ResponseReceived, save_response)
+    """
+    setattr(handler, "_zendriver_threaded", True)
+    return handler
+
+
+def _serialize_error(obj: dict[str, Any]) -> str:
+    """
+    formats a (nested) error dict as indented "key: value" lines.
+    uses an explicit stack instead of recursion.
+    """
+    out = ["\n"]
+    stack = [(iter(obj.items()), 0)]
+    while stack:
+        items, depth = stack[-1]
+        for k, v in items:
+            space = "\t" * depth
+            if isinstance(v, dict):
+                out.append(f"{space}{k}: \n")
+                stack.append((iter(v.items()), depth + 1))
+                break
+            out.append(f"{space}{k}: {v}\n")
+        else:
+            stack.pop()
+            if stack:
+                out.append("\n")
+    return "".join(out)
+
 
 class ProtocolException(Exception):
     def __init__(self, *args: Any):
@@ -53,19 +161,7 @@ class ProtocolException(Exception):
             self.code = args[0].get("code", None)
 
         elif hasattr(args[0], "to_json"):
-
-            def serialize(obj: Any, _d: int = 0) -> str:
-                res = "\n"
-                for k, v in obj.items():
-                    space = "\t" * _d
-                    if isinstance(v, dict):
-                        res += f"{space}{k}: {serialize(v, _d + 1)}\n"
-                    else:
-                        res += f"{space}{k}: {v}\n"
-
-                return res
-
-            self.message = serialize(args[0].to_json())
+            self.message = _serialize_error(args[0].to_json())
 
         else:
             self.message = "| ".join(str(x) for x in args)
@@ -78,6 +174,117 @@ class SettingClassVarNotAllowedException(PermissionError):
     pass
 
 
+class HandlerList(list[Any]):
+    """
+    list of handlers for a single event type, as stored in a :class:`HandlerDict`.
+
+    mutating it in place (append, remove, ...) bumps the version of the owning
+    :class:`HandlerDict`, so `connection.handlers[event].append(handler)` is picked up
+    just like :meth:`Connection.add_handler`.
+    """
+
+    __slots__ = ("_owner",)
+
+    def __init__(self, owner: HandlerDict, iterable: Iterable[Any] = ()) -> None:
+        super().__init__(iterable)
+        self._owner = owner
+
+
+def _bumps_version(method: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(method)
+    def wrapper(self: HandlerList, *args: Any, **kwargs: Any) -> Any:
+        result = method(self, *args, **kwargs)
+        self._owner.version += 1
+        return result
+
+    return wrapper
+
+
+for _name in (
+    "append",
+    "extend",
+    "insert",
+    "remove",
+    "pop",
+    "clear",
+    "sort",
+    "reverse",
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+):
+    setattr(HandlerList, _name, _bumps_version(getattr(list, _name)))
+del _name
+
+
+class HandlerDict(collections.defaultdict):  # type: ignore
+    """
+    mapping of event type -> list of handlers.
+
+    keeps a `version` counter which is bumped whenever the mapping or one of its
+    handler lists changes, so work derived from the handlers (like enabling domains)
+    can be skipped when nothing changed. lists stored in it are copied into a
+    :class:`HandlerList`, which reports in-place mutations to the dict.
+    """
+
+    def __init__(
+        self,
+        default_factory: Callable[[], Any] | None = list,
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(default_factory)
+        self.version = 0
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def _wrap(self, value: Any) -> Any:
+        if isinstance(value, HandlerList) and value._owner is self:
+            return value
+        if isinstance(value, list):
+            return HandlerList(self, value)
+        return value
+
+    def __missing__(self, key: Any) -> Any:
+        if self.default_factory is None:
+            raise KeyError(key)
+        self[key] = self.default_factory()
+        return super().__getitem__(key)
+
+    def touch(self) -> None:
+        self.version += 1
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, self._wrap(value))
+        self.version += 1
+
+    def __delitem__(self, key: Any) -> None:
+        super().__delitem__(key)
+        self.version += 1
+
+    def pop(self, *args: Any) -> Any:
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self) -> Any:
+        self.version += 1
+        return super().popitem()
+
+    def clear(self) -> None:
+        super().clear()
+        self.version += 1
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+
 class Transaction(asyncio.Future[Any]):
     def __init__(self, cdp_obj: Generator[dict[str, Any], dict[str, Any], Any]):
         """
@@ -92,10 +299,18 @@ class Transaction(asyncio.Future[Any]):
         if params:
             params = params.pop()
         self.params = params
+        # method/params don't change after creation, so serialize them once
+        # and only splice in the id when the message is sent
+        self._prefix = _dumps({"method": self.method, "params": self.params})[:-1]
 
     @property
-    def message(self) -> str:
-        return json.dumps({"method": self.method, "params": self.params, "id": self.id})
+    def message(self) -> bytes:
+        """
+        the serialized (utf-8 encoded json) command.
+        must be sent as a text frame, chrome does not accept binary frames.
+        """
+        assert self.id is not None, "transaction id must be set before sending"
+        return b'%s,"id":%d}' % (self._prefix, self.id)
 
     @property
     def has_exception(self) -> bool:
@@ -188,7 +403,6 @@ class CantTouchThis(type):
 class Connection(metaclass=CantTouchThis):
     websocket: websockets.asyncio.client.ClientConnection | None = None
     _target: cdp.target.TargetInfo | None
-    _current_id_mutex: asyncio.Lock = asyncio.Lock()
     _download_behavior: List[str] | None = None
 
     def __init__(
@@ -200,18 +414,28 @@ class Connection(metaclass=CantTouchThis):
     ):
         super().__init__()
         self._target = target
-        self.__count__ = itertools.count(0)
+        self._next_id = 0
         self._owner = _owner
         self.websocket_url: str = websocket_url
         self.websocket = None
         self.mapper: dict[int, Transaction] = {}
-        self.handlers: dict[Any, list[Union[Callable, Awaitable]]] = (  # type: ignore
-            collections.defaultdict(list)
-        )
+        self._fast_mapper: list[Transaction | None] = [None] * MAPPER_SLOTS
+        self.handlers: dict[Any, list[Union[Callable, Awaitable]]] = HandlerDict()  # type: ignore
+        # handlers version for which the domains were last registered
+        self._registered_handlers_version = -1
+        # event type -> [(handler, is_coroutine_function, threaded)], rebuilt when the handlers change
+        self._dispatch: dict[type, list[_DispatchEntry]] = {}
+        self._dispatch_version = -1
         self.recv_task = None
         self.enabled_domains: list[Any] = []
         self._last_result: list[Any] = []
         self.listener: Listener | None = None
+        # outgoing transactions, written to the websocket by a single writer task
+        self._send_buffer: collections.deque[Transaction] = collections.deque()
+        self._send_pending = asyncio.Event()
+        self._writer_task: asyncio.Task[None] | None = None
+        # set once the websocket is open and the expert/headless preparations are done
+        self._ready = False
         self.__dict__.update(**kwargs)
 
     @property
@@ -331,6 +555,33 @@ class Connection(metaclass=CantTouchThis):
     def closed(self) -> bool:
         return self.websocket is None
 
+    def _add_transaction(self, tx: Transaction) -> None:
+        """
+        registers a transaction by its id.
+        non-negative ids are stored in the fast slot list when their slot is free
+        (or only holds an already finished transaction), others go to the mapper dict.
+        """
+        tx_id = typing.cast(int, tx.id)
+        if tx_id >= 0:
+            slot = tx_id & MAPPER_MASK
+            current = self._fast_mapper[slot]
+            if current is None or current.done():
+                self._fast_mapper[slot] = tx
+                return
+        self.mapper[tx_id] = tx
+
+    def _pop_transaction(self, tx_id: int) -> Transaction | None:
+        """
+        removes and returns the transaction registered under `tx_id`, if any.
+        """
+        if tx_id >= 0:
+            slot = tx_id & MAPPER_MASK
+            tx = self._fast_mapper[slot]
+            if tx is not None and tx.id == tx_id:
+                self._fast_mapper[slot] = None
+                return tx
+        return self.mapper.pop(tx_id, None)
+
     def add_handler(
         self,
         event_type_or_domain: Union[type, types.ModuleType],
@@ -344,6 +595,8 @@ class Connection(metaclass=CantTouchThis):
 
         if you want to receive event updates (network traffic are also 'events') you can add handlers for those events.
         handlers can be regular callback functions or async coroutine functions (and also just lamba's).
+        regular callback functions are called on the event loop, so they should not block,
+        decorate them with :func:`threaded_handler` to run them in a worker thread instead.
         for example, you want to check the network traffic:
 
         .. code-block::
@@ -361,15 +614,7 @@ class Connection(metaclass=CantTouchThis):
         :rtype:
         """
         if isinstance(event_type_or_domain, types.ModuleType):
-            for name, obj in inspect.getmembers_static(event_type_or_domain):
-                if name.isupper():
-                    continue
-                if not name[0].isupper():
-                    continue
-                if type(obj) is type:
-                    continue
-                if inspect.isbuiltin(obj):
-                    continue
+            for obj in _module_events(event_type_or_domain):
                 self.handlers[obj].append(handler)
 
         else:
@@ -414,6 +659,32 @@ class Connection(metaclass=CantTouchThis):
         if handler in self.handlers[event_type]:
             self.handlers[event_type].remove(handler)
 
+    def _get_dispatch_table(self) -> dict[type, list[_DispatchEntry]]:
+        """
+        returns the event type -> handlers table used by the listener,
+        with the coroutine check of each handler done up front.
+        """
+        version = self.handlers.version  # type: ignore
+        if version != self._dispatch_version:
+            self._dispatch = {
+                event_type: [self._dispatch_entry(handler) for handler in handlers]
+                for event_type, handlers in self.handlers.items()
+                if handlers
+            }
+            self._dispatch_version = version
+        return self._dispatch
+
+    @staticmethod
+    def _dispatch_entry(
+        handler: Union[Callable[..., Any], Awaitable[Any]],
+    ) -> _DispatchEntry:
+        callback = typing.cast(Callable[..., Any], handler)
+        return (
+            callback,
+            iscoroutinefunction(callback),
+            bool(getattr(callback, "_zendriver_threaded", False)),
+        )
+
     async def aopen(self) -> None:
         """
         opens the websocket connection. should not be called manually by users
@@ -437,6 +708,7 @@ class Connection(metaclass=CantTouchThis):
         if not self.listener or not self.listener.running:
             self.listener = Listener(self)
             logger.debug("\n✅  opened websocket connection to %s", self.websocket_url)
+        self._ensure_writer()
 
         # when a websocket connection is closed (either by error or on purpose)
         # and reconnected, the registered event listeners (if any), should be
@@ -451,8 +723,11 @@ class Connection(metaclass=CantTouchThis):
             if self.listener and self.listener.running:
                 self.listener.cancel()
                 self.enabled_domains.clear()
+                self._registered_handlers_version = -1
+            self._stop_writer("websocket connection closed")
             await self.websocket.close()
             self.websocket = None
+            self._ready = False
             logger.debug("\n❌ closed websocket connection to %s", self.websocket_url)
 
     async def sleep(self, t: Union[int, float] = 0.25) -> None:
@@ -550,29 +825,25 @@ class Connection(metaclass=CantTouchThis):
             when multiple calls to connection.send() are made
         :return:
         """
-        await self.aopen()
-        if self.websocket is None:
-            return  # type: ignore
-        if self._owner:
-            browser = self._owner
-            if browser.config:
-                if browser.config.expert:
-                    await self._prepare_expert()
-                if browser.config.headless:
-                    await self._prepare_headless()
+        if not self._ready or self.websocket is None:
+            await self._ensure_ready()
+            if self.websocket is None:
+                return  # type: ignore
         if not self.listener or not self.listener.running:
             self.listener = Listener(self)
+        self._ensure_writer()
 
         tx = Transaction(cdp_obj)
         tx.connection = self
-        if not self.mapper:
-            self.__count__ = itertools.count(0)
-        async with self._current_id_mutex:
-            tx.id = next(self.__count__)
-        self.mapper.update({tx.id: tx})
+        # ids only ever increase, so a late response can never be matched to
+        # a newer transaction. no lock needed, nothing can interleave here.
+        self._next_id += 1
+        tx.id = self._next_id
+        self._add_transaction(tx)
         if not _is_update:
             await self._register_handlers()
-        await self.websocket.send(tx.message)
+        self._send_buffer.append(tx)
+        self._send_pending.set()
         try:
             return await tx  # type: ignore
         except ProtocolException as e:
@@ -580,26 +851,120 @@ class Connection(metaclass=CantTouchThis):
             e.message += f"\ncommand:{tx.method}\nparams:{tx.params}"
             raise e
 
+    def _ensure_writer(self) -> None:
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def _writer_loop(self) -> None:
+        """
+        writes queued transactions to the websocket.
+
+        concurrent send() calls only append to the buffer, and all messages
+        queued by the time this task runs are written back to back in one go,
+        instead of every caller suspending on its own websocket write.
+        """
+        buffer = self._send_buffer
+        pending = self._send_pending
+        while True:
+            await pending.wait()
+            while buffer:
+                tx = buffer.popleft()
+                if tx.done():
+                    # cancelled while queued
+                    continue
+                websocket = self.websocket
+                if websocket is None:
+                    self._fail_transaction(tx, "no websocket connection")
+                    self._fail_buffered_sends("no websocket connection")
+                    return
+                try:
+                    await websocket.send(tx.message, text=True)
+                except websockets.exceptions.ConnectionClosed as e:
+                    reason = f"websocket connection closed: {e}"
+                    self._fail_transaction(tx, reason)
+                    self._fail_buffered_sends(reason)
+                    return
+                except asyncio.CancelledError:
+                    # connection is being closed, don't leave the sender hanging
+                    self._pop_transaction(typing.cast(int, tx.id))
+                    tx.cancel()
+                    raise
+                except Exception as e:
+                    self._pop_transaction(typing.cast(int, tx.id))
+                    if not tx.done():
+                        tx.set_exception(e)
+            pending.clear()
+
+    def _fail_transaction(self, tx: Transaction, reason: str) -> None:
+        self._pop_transaction(typing.cast(int, tx.id))
+        if not tx.done():
+            tx.set_exception(ProtocolException(reason))
+
+    def _fail_buffered_sends(self, reason: str) -> None:
+        """
+        fails all transactions that are still waiting to be written.
+        """
+        buffer = self._send_buffer
+        while buffer:
+            self._fail_transaction(buffer.popleft(), reason)
+
+    def _stop_writer(self, reason: str) -> None:
+        """
+        stops the writer task and fails whatever it didn't send yet.
+        """
+        if self._writer_task is not None and not self._writer_task.done():
+            self._writer_task.cancel()
+        self._writer_task = None
+        self._fail_buffered_sends(reason)
+
+    async def _ensure_ready(self) -> None:
+        """
+        opens the connection and runs the one-time expert/headless preparations.
+        once done, send() skips straight to sending until the connection is closed.
+        """
+        await self.aopen()
+        if self.websocket is None:
+            return
+        if self._owner:
+            browser = self._owner
+            if browser.config:
+                if browser.config.expert:
+                    await self._prepare_expert()
+                if browser.config.headless:
+                    await self._prepare_headless()
+        self._ready = self.websocket is not None
+
     #
     async def _register_handlers(self) -> None:
         """
         ensure that for current (event) handlers, the corresponding
         domain is enabled in the protocol.
 
+        this is skipped when the handlers did not change since the last
+        (successful) registration.
         """
+        handlers = self.handlers
+        if handlers.version == self._registered_handlers_version:  # type: ignore
+            return
+        dead = [event_type for event_type, cbs in handlers.items() if not cbs]
+        for event_type in dead:
+            handlers.pop(event_type, None)
+        version = handlers.version  # type: ignore
+        # resolve the domains up front (no awaits in between), so the handlers
+        # can't change while we iterate and don't need to be copied
+        domains = dict.fromkeys(
+            _domain_of(event_type)
+            for event_type in handlers
+            if isinstance(event_type, type)
+        )
+        complete = True
         # save a copy of current enabled domains in a variable
         # domains will be removed from this variable
         # if it is still needed according to the set handlers
         # so at the end this variable will hold the domains that
         # are not represented by handlers, and can be removed
         enabled_domains = self.enabled_domains.copy()
-        for event_type in self.handlers.copy():
-            if len(self.handlers[event_type]) == 0:
-                self.handlers.pop(event_type)
-                continue
-            if not isinstance(event_type, type):
-                continue
-            domain_mod = util.cdp_get_module(event_type.__module__)
+        for domain_mod in domains:
             if domain_mod in self.enabled_domains:
                 # at this point, the domain is being used by a handler
                 # so remove that domain from temp variable 'enabled_domains' if present
@@ -620,6 +985,8 @@ class Connection(metaclass=CantTouchThis):
 
                 except:  # noqa - as broad as possible, we don't want an error before the "actual" request is sent
                     logger.debug("", exc_info=True)
+                    # try again on the next send
+                    complete = False
                     try:
                         self.enabled_domains.remove(domain_mod)
                     except:  # noqa
@@ -632,6 +999,8 @@ class Connection(metaclass=CantTouchThis):
             # temp variable when we registered it or saw handlers for it.
             # items still present at this point are unused and need removal
             self.enabled_domains.remove(ed)
+        if complete:
+            self._registered_handlers_version = version
 
     async def _prepare_headless(self) -> None:
         if getattr(self, "_prep_headless_done", None):
@@ -679,8 +1048,8 @@ class Connection(metaclass=CantTouchThis):
         tx = Transaction(cdp_obj)
         tx.connection = self
         tx.id = -2
-        self.mapper.update({tx.id: tx})
-        await self.websocket.send(tx.message)
+        self._add_transaction(tx)
+        await self.websocket.send(tx.message, text=True)
         try:
             # in try except since if browser connection sends this it reises an exception
             return await tx
@@ -736,123 +1105,148 @@ class Listener:
         return True
 
     async def listener_loop(self) -> None:
-        while True:
-            if self.connection.websocket is None:
-                raise ValueError("no websocket connection")
+        # everything used per message is bound to a local once, so the loop
+        # itself doesn't repeat the same attribute/global lookups for every frame
+        loop = asyncio.get_running_loop()
+        connection = self.connection
+        idle = self.idle
+        loads = _loads
+        pop_transaction = connection._pop_transaction
+        get_dispatch_table = connection._get_dispatch_table
+        event_parsers = cdp.util._event_parsers
+        create_task = asyncio.create_task
+        call_soon = loop.call_soon
+        wait_for = asyncio.wait_for
+        debug_enabled = logger.isEnabledFor
+        try:
+            while True:
+                websocket = connection.websocket
+                if websocket is None:
+                    raise ValueError("no websocket connection")
 
-            try:
-                msg = await asyncio.wait_for(
-                    self.connection.websocket.recv(), self.time_before_considered_idle
-                )
-            except asyncio.TimeoutError:
-                self.idle.set()
-                # breathe
-                # await asyncio.sleep(self.time_before_considered_idle / 10)
-                continue
-            except asyncio.CancelledError:
-                logger.debug(
-                    "task was cancelled while reading websocket, breaking loop"
-                )
-                break
-            except websockets.exceptions.ConnectionClosedError as e:
-                # break on connection closed
-                logger.debug(
-                    "connection listener exception while reading websocket:\n%s", e
-                )
-                break
+                try:
+                    # decode=False: hand the raw utf-8 payload straight to the json
+                    # parser instead of decoding it to a str first
+                    msg = await wait_for(
+                        websocket.recv(decode=False),
+                        self._time_before_considered_idle,
+                    )
+                except asyncio.TimeoutError:
+                    idle.set()
+                    # breathe
+                    # await asyncio.sleep(self.time_before_considered_idle / 10)
+                    continue
+                except asyncio.CancelledError:
+                    logger.debug(
+                        "task was cancelled while reading websocket, breaking loop"
+                    )
+                    break
+                except websockets.exceptions.ConnectionClosed as e:
+                    # break on connection closed
+                    logger.debug(
+                        "connection listener exception while reading websocket:\n%s", e
+                    )
+                    break
 
-            if not self.running:
-                # if we have been cancelled or otherwise stopped running
-                # break this loop
-                break
+                if not self.running:
+                    # if we have been cancelled or otherwise stopped running
+                    # break this loop
+                    break
 
-            # since we are at this point, we are not "idle" anymore.
-            self.idle.clear()
+                # since we are at this point, we are not "idle" anymore.
+                idle.clear()
 
-            message = json.loads(msg)
-            if "id" in message:
-                # response to our command
-                if message["id"] in self.connection.mapper:
+                try:
+                    message = loads(msg)
+                except ValueError:
+                    # never let a single malformed frame stop the listener
+                    logger.warning(
+                        "could not decode message: %r", msg[:200], exc_info=True
+                    )
+                    continue
+                message_id = message.get("id")
+                if message_id is not None:
+                    # response to our command
                     # get the corresponding Transaction
 
                     # thanks to zxsleebu for discovering the memory leak
                     # pop to prevent memory leaks
-                    tx = self.connection.mapper.pop(message["id"])
-                    logger.debug("got answer for %s (message_id:%d)", tx, message["id"])
+                    tx = pop_transaction(message_id)
+                    if tx is not None:
+                        if debug_enabled(logging.DEBUG):
+                            logger.debug(
+                                "got answer for %s (message_id:%d)", tx, message_id
+                            )
 
-                    # complete the transaction, which is a Future object
-                    # and thus will return to anyone awaiting it.
-                    tx(**message)
+                        # complete the transaction, which is a Future object
+                        # and thus will return to anyone awaiting it.
+                        tx(**message)
                 else:
-                    if message["id"] == -2:
-                        maybe_tx = self.connection.mapper.get(-2)
-                        if maybe_tx:
-                            tx = maybe_tx
-                            tx(**message)
+                    # probably an event
+                    event_type = event_parsers.get(message.get("method"))
+                    if event_type is None:
+                        logger.info("unknown event received: %s", message)
                         continue
-            else:
-                # probably an event
-                try:
-                    event = cdp.util.parse_json_event(message)
-                    event_tx = EventTransaction(event)
-                    if not self.connection.mapper:
-                        self.connection.__count__ = itertools.count(0)
-                    event_tx.id = next(self.connection.__count__)
-                    self.connection.mapper[event_tx.id] = event_tx
-                except Exception as e:
-                    logger.info(
-                        "%s: %s  during parsing of json from event : %s"
-                        % (type(e).__name__, e.args, message),
-                        exc_info=True,
-                    )
-                    continue
-                except KeyError as e:
-                    logger.info("some lousy KeyError %s" % e, exc_info=True)
-                    continue
-                try:
-                    if type(event) in self.connection.handlers:
-                        callbacks = self.connection.handlers[type(event)]
-                    else:
+                    callbacks = get_dispatch_table().get(event_type)
+                    if not callbacks:
+                        # nobody listens for this event, so don't bother parsing it
                         continue
-                    if not len(callbacks):
+                    try:
+                        event = event_type.from_json(message["params"])
+                    except Exception as e:
+                        logger.info(
+                            "%s: %s  during parsing of json from event : %s"
+                            % (type(e).__name__, e.args, message),
+                            exc_info=True,
+                        )
                         continue
-                    for callback in callbacks:
-                        try:
-                            if iscoroutinefunction(callback):
-                                try:
-                                    asyncio.create_task(
-                                        callback(event, self.connection)
-                                    )
-                                except TypeError:
-                                    asyncio.create_task(callback(event))
-                            else:
-                                callback = typing.cast(Callable, callback)  # type: ignore
-
-                                def run_callback() -> None:
+                    try:
+                        for callback, is_coroutine, threaded in callbacks:
+                            try:
+                                if is_coroutine:
                                     try:
-                                        callback(event, self.connection)
+                                        create_task(callback(event, connection))
                                     except TypeError:
-                                        callback(event)
-
-                                asyncio.create_task(asyncio.to_thread(run_callback))
-                        except Exception as e:
-                            logger.warning(
-                                "exception in callback %s for event %s => %s",
-                                callback,
-                                event.__class__.__name__,
-                                e,
-                                exc_info=True,
-                            )
-                            raise
-                except asyncio.CancelledError:
-                    break
-                except Exception:
-                    raise
-                continue
+                                        create_task(callback(event))
+                                else:
+
+                                    def run_callback(
+                                        callback: Callable[..., Any] = callback,
+                                        event: Any = event,
+                                    ) -> None:
+                                        try:
+                                            callback(event, connection)
+                                        except TypeError:
+                                            callback(event)
+
+                                    if threaded:
+                                        create_task(asyncio.to_thread(run_callback))
+                                    else:
+                                        # run inline on the loop, no thread pool round-trip
+                                        call_soon(run_callback)
+                            except Exception as e:
+                                logger.warning(
+                                    "exception in callback %s for event %s => %s",
+                                    callback,
+                                    event.__class__.__name__,
+                                    e,
+                                    exc_info=True,
+                                )
+                                raise
+                    except asyncio.CancelledError:
+                        break
+                    except Exception:
+                        raise
+                    continue
+        finally:
+            # the writer can't do anything without us reading the responses,
+            # so stop it and fail what it didn't send yet
+            if connection.listener is self or connection.listener is None:
+                connection._stop_writer("websocket listener stopped")
 
     def __repr__(self) -> str:
-        s_idle = "[idle]" if self.idle.is_set() else "[busy]"
-        s_cache_length = f"[cache size: {len(self.history)}]"
-        s_running = f"[running: {self.running}]"
-        s = f"{self.__class__.__name__} {s_running} {s_idle} {s_cache_length}>"
-        return s
+        return (
+            f"{type(self).__name__} [running: {self.running}] "
+            f"{'[idle]' if self.idle.is_set() else '[busy]'} "
+            f"[cache size: {len(self.history)}]>"
+        )